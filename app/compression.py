@@ -0,0 +1,308 @@
+import gzip
+import hashlib
+import threading
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Callable, Dict, Optional
+
+from starlette.concurrency import run_in_threadpool
+from starlette.datastructures import Headers, MutableHeaders
+
+# Optional codecs: brotli and zstd are only offered when their packages are installed.
+# gzip is part of the standard library and is always available.
+try:
+    import brotli
+except ImportError:  # pragma: no cover - depends on the environment
+    brotli = None
+
+try:
+    import zstandard
+except ImportError:  # pragma: no cover - depends on the environment
+    zstandard = None
+
+
+def _gzip(body: bytes, level: int) -> bytes:
+    return gzip.compress(body, compresslevel=level, mtime=0)
+
+
+def _brotli(body: bytes, level: int) -> bytes:
+    return brotli.compress(body, quality=level)
+
+
+def _zstd(body: bytes, level: int) -> bytes:
+    return zstandard.ZstdCompressor(level=level).compress(body)
+
+
+# Encoders in server preference order, with the default level used for each one.
+# The order is used to break ties when the client accepts several encodings equally.
+ENCODERS: Dict[str, Callable[[bytes, int], bytes]] = {}
+DEFAULT_LEVELS: Dict[str, int] = {}
+if zstandard is not None:
+    ENCODERS["zstd"] = _zstd
+    DEFAULT_LEVELS["zstd"] = 3
+if brotli is not None:
+    ENCODERS["br"] = _brotli
+    DEFAULT_LEVELS["br"] = 4
+ENCODERS["gzip"] = _gzip
+DEFAULT_LEVELS["gzip"] = 6
+
+# Only textual payloads are worth compressing; images and archives are already compressed.
+COMPRESSIBLE_TYPES = ("application/json", "text/", "application/javascript", "application/xml")
+
+
+@dataclass(frozen=True)
+class CompressionPolicy:
+    """
+    Compression settings for a group of routes.
+
+    Attributes:
+        enabled (bool): Whether responses on the route may be compressed at all.
+        minimum_size (Optional[int]): Smallest body (in bytes) worth compressing. Falls back to the middleware default.
+        cache (bool): Whether compressed variants of the route's responses are kept in the precompressed cache.
+        exact (bool): Whether the policy applies to the path itself only, not to the paths below it.
+    """
+    enabled: bool = True
+    minimum_size: Optional[int] = None
+    cache: bool = False
+    exact: bool = False
+
+
+class CompressionStats:
+    """
+    Running totals used to compare bytes saved against the CPU time spent compressing.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        with self._lock:
+            self.responses = 0
+            self.bytes_in = 0
+            self.bytes_out = 0
+            self.cpu_seconds = 0.0
+            self.cache_hits = 0
+
+    def record(self, bytes_in: int, bytes_out: int, cpu_seconds: float, cache_hit: bool):
+        with self._lock:
+            self.responses += 1
+            self.bytes_in += bytes_in
+            self.bytes_out += bytes_out
+            self.cpu_seconds += cpu_seconds
+            self.cache_hits += int(cache_hit)
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            return {
+                "responses": self.responses,
+                "bytes_in": self.bytes_in,
+                "bytes_out": self.bytes_out,
+                "bytes_saved": self.bytes_in - self.bytes_out,
+                "cpu_seconds": self.cpu_seconds,
+                "cache_hits": self.cache_hits,
+            }
+
+
+class PrecompressedCache:
+    """
+    Small LRU cache of compressed bodies keyed by encoding and a digest of the uncompressed body.
+
+    Hot pages (e.g. the first page of GET /posts) produce identical bodies between writes,
+    so their compressed variants are computed once and then served from memory. The cache
+    holds at most `max_entries` bodies and `max_bytes` bytes; a body larger than a quarter
+    of `max_bytes` is not cached, so one huge page cannot evict all the others.
+    """
+
+    def __init__(self, max_entries: int = 256, max_bytes: int = 8 * 1024 * 1024):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.size = 0
+        self._entries: "OrderedDict[tuple, bytes]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def key(encoding: str, body: bytes) -> tuple:
+        return (encoding, hashlib.blake2b(body, digest_size=16).digest())
+
+    def get(self, key: tuple) -> Optional[bytes]:
+        with self._lock:
+            value = self._entries.get(key)
+            if value is not None:
+                self._entries.move_to_end(key)
+            return value
+
+    def put(self, key: tuple, value: bytes):
+        if len(value) > self.max_bytes // 4:
+            return
+        with self._lock:
+            previous = self._entries.pop(key, None)
+            if previous is not None:
+                self.size -= len(previous)
+            self._entries[key] = value
+            self.size += len(value)
+            while len(self._entries) > self.max_entries or self.size > self.max_bytes:
+                _, evicted = self._entries.popitem(last=False)
+                self.size -= len(evicted)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self.size = 0
+
+    def __len__(self):
+        return len(self._entries)
+
+
+def negotiate_encoding(accept_encoding: str) -> Optional[str]:
+    """
+    Picks the best available encoding for an Accept-Encoding header.
+
+    Args:
+        accept_encoding (str): Raw Accept-Encoding header value.
+
+    Returns:
+        Optional[str]: The chosen encoding, or None if the response should be sent uncompressed.
+    """
+    weights = {}
+    for part in accept_encoding.split(","):
+        coding, _, params = part.strip().partition(";")
+        coding = coding.strip().lower()
+        if not coding:
+            continue
+        q = 1.0
+        params = params.strip()
+        if params.startswith("q="):
+            try:
+                q = float(params[2:])
+            except ValueError:
+                q = 0.0
+        weights[coding] = q
+
+    best, best_q = None, 0.0
+    for encoding in ENCODERS:
+        q = weights.get(encoding, weights.get("*", 0.0))
+        if q > best_q:
+            best, best_q = encoding, q
+    return best
+
+
+class CompressionMiddleware:
+    """
+    ASGI middleware that compresses response bodies with gzip, brotli or zstd.
+
+    The encoding is negotiated from the request's Accept-Encoding header. Bodies smaller than
+    the route's minimum size are sent as-is, and bodies at or above `offload_size` are compressed
+    in the threadpool so large listings do not block the event loop. Streaming responses are
+    passed through untouched.
+    """
+
+    def __init__(
+        self,
+        app,
+        minimum_size: int = 1024,
+        offload_size: int = 64 * 1024,
+        route_policies: Optional[Dict[str, CompressionPolicy]] = None,
+        cache: Optional[PrecompressedCache] = None,
+        stats: Optional[CompressionStats] = None,
+    ):
+        self.app = app
+        self.minimum_size = minimum_size
+        self.offload_size = offload_size
+        # Longest prefixes first so the most specific policy wins.
+        self.route_policies = sorted((route_policies or {}).items(), key=lambda item: len(item[0]), reverse=True)
+        self.cache = cache if cache is not None else PrecompressedCache()
+        self.stats = stats if stats is not None else CompressionStats()
+
+    def policy_for(self, path: str) -> CompressionPolicy:
+        for prefix, policy in self.route_policies:
+            if path == prefix or (not policy.exact and path.startswith(prefix.rstrip("/") + "/")):
+                return policy
+        return CompressionPolicy()
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        policy = self.policy_for(scope["path"])
+        encoding = negotiate_encoding(Headers(scope=scope).get("accept-encoding", ""))
+        if not policy.enabled or encoding is None:
+            await self.app(scope, receive, send)
+            return
+
+        minimum_size = policy.minimum_size if policy.minimum_size is not None else self.minimum_size
+        start_message = None
+        body_parts = []
+        passthrough = False
+
+        async def send_wrapper(message):
+            nonlocal start_message, passthrough
+
+            if message["type"] == "http.response.start":
+                # Hold the start message until the body size is known.
+                start_message = message
+                return
+
+            if message["type"] != "http.response.body" or passthrough:
+                await send(message)
+                return
+
+            if message.get("more_body", False) and not body_parts:
+                # Streaming response: send it unmodified.
+                passthrough = True
+                await send(start_message)
+                await send(message)
+                return
+
+            body_parts.append(message.get("body", b""))
+            if message.get("more_body", False):
+                return
+
+            body = b"".join(body_parts)
+            headers = MutableHeaders(raw=start_message["headers"])
+            if not self._should_compress(headers, body, minimum_size):
+                await send(start_message)
+                await send({"type": "http.response.body", "body": body})
+                return
+
+            compressed = await self._compress(encoding, body, policy.cache)
+            headers["Content-Encoding"] = encoding
+            headers["Content-Length"] = str(len(compressed))
+            headers.add_vary_header("Accept-Encoding")
+            await send(start_message)
+            await send({"type": "http.response.body", "body": compressed})
+
+        await self.app(scope, receive, send_wrapper)
+
+    @staticmethod
+    def _should_compress(headers: MutableHeaders, body: bytes, minimum_size: int) -> bool:
+        if len(body) < minimum_size or "content-encoding" in headers:
+            return False
+        content_type = headers.get("content-type", "")
+        return content_type.startswith(COMPRESSIBLE_TYPES)
+
+    async def _compress(self, encoding: str, body: bytes, use_cache: bool) -> bytes:
+        key = PrecompressedCache.key(encoding, body) if use_cache else None
+        if key is not None:
+            cached = self.cache.get(key)
+            if cached is not None:
+                self.stats.record(len(body), len(cached), 0.0, cache_hit=True)
+                return cached
+
+        if len(body) >= self.offload_size:
+            compressed, elapsed = await run_in_threadpool(_timed_compress, encoding, body)
+        else:
+            compressed, elapsed = _timed_compress(encoding, body)
+
+        if key is not None:
+            self.cache.put(key, compressed)
+        self.stats.record(len(body), len(compressed), elapsed, cache_hit=False)
+        return compressed
+
+
+def _timed_compress(encoding: str, body: bytes):
+    start = time.perf_counter()
+    compressed = ENCODERS[encoding](body, DEFAULT_LEVELS[encoding])
+    return compressed, time.perf_counter() - start
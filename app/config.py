@@ -14,6 +14,31 @@ class Settings(BaseSettings):
     secret_key: str                # Secret key for JWT or other cryptographic operations
     algorithm: str                 # Algorithm used for cryptographic operations
     acces_token_expire_minutes: int # Access token expiration time in minutes
+    refresh_token_expire_days: int = 30 # Refresh token (session) lifetime in days
+
+    # Response compression settings. These have defaults so existing deployments keep working.
+    compression_minimum_size: int = 1024       # Smallest response body (bytes) worth compressing
+    compression_offload_size: int = 65536      # Bodies this large are compressed off the event loop
+    compression_cache_entries: int = 256       # Max precompressed responses kept in memory
+    compression_cache_bytes: int = 8388608     # Max bytes of precompressed responses kept in memory
+
+    # Table partitioning. Only applies when the tables are first created (see app/partitions.py).
+    database_partitioning: bool = False        # Partition posts by created_at month and votes by post_id hash
+    votes_partitions: int = 8                  # Number of hash partitions for votes
+    partition_months_ahead: int = 3            # Future monthly posts partitions to keep pre-created
+    partition_retention_months: int = 24       # Posts partitions older than this are archived
+    partition_archive_dir: str = "archive"     # Where archived partitions are exported
+    partition_lock_timeout: str = "5s"         # Longest wait for the lock to detach a partition
+
+    # Profiling (see app/profiling.py). Admin endpoints are restricted to admin_emails.
+    admin_emails: str = ""                     # Comma-separated emails of admin users
+    profiling_sampler_enabled: bool = True     # Run the always-on sampling profiler
+    profiling_sample_interval_ms: int = 10     # Time between stack samples
+    profiling_max_overhead: float = 0.01       # Max fraction of wall time spent sampling
+
+    # Owner-based sharding of posts and votes (see app/sharding.py)
+    sharding_enabled: bool = False             # Store posts and votes on the shard nodes
+    shard_map_path: str = "shard_map.json"     # Shard nodes and bucket routing
     
     # Config class allows customization of how the environment variables are loaded.
     # 'env_file' specifies that the environment variables should be read from the .env file this is for local.
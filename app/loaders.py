@@ -0,0 +1,188 @@
+from typing import Callable, Dict, Hashable, Iterable, List
+from fastapi import HTTPException, status
+from . import database, sharding
+from .config import settings
+
+# Upper bound on the number of ids accepted by the multi-get endpoints
+MAX_BATCH_IDS = 100
+
+# Same shape as the listing query in routers/post.py, so rows can be formatted the same way.
+# Votes are counted in a subquery so the query also works on the partitioned schema,
+# where posts are keyed by (id, created_at).
+POSTS_BY_ID_QUERY = """
+    SELECT p.id, p.title, p.content, p.published, p.created_at, p.owner_id,
+           u.email AS owner_email, u.created_at AS owner_created_at,
+           (SELECT count(*) FROM votes v WHERE v.post_id = p.id) AS votes
+    FROM posts p
+    LEFT JOIN users u ON u.id = p.owner_id
+    WHERE p.id = ANY(%s)
+"""
+
+
+class DataLoader:
+    """
+    Per-request loader that coalesces lookups by key into a single batched query.
+
+    Keys can be queued with `defer` and are fetched together on the next `dispatch`
+    (or on the first `load`/`load_many` that needs them). Results are memoized for the
+    lifetime of the loader, so the same key is never queried twice within a request.
+    Keys that the batch function does not return resolve to `default`.
+    """
+
+    def __init__(self, batch_fn: Callable[[List[Hashable]], Dict[Hashable, object]], default=None):
+        self.batch_fn = batch_fn
+        self.default = default
+        self._cache: Dict[Hashable, object] = {}
+        self._queue: List[Hashable] = []
+
+    def prime(self, key: Hashable, value):
+        """Stores an already known value so it is not fetched again."""
+        self._cache.setdefault(key, value)
+
+    def defer(self, key: Hashable) -> Callable[[], object]:
+        """
+        Queues a key for the next batch.
+
+        Returns:
+            Callable: Resolves the value, dispatching the pending batch if needed.
+        """
+        if key not in self._cache and key not in self._queue:
+            self._queue.append(key)
+        return lambda: self.load(key)
+
+    def dispatch(self):
+        """Fetches every queued key in one batch call."""
+        keys, self._queue = self._queue, []
+        missing = [key for key in keys if key not in self._cache]
+        if not missing:
+            return
+        found = self.batch_fn(missing)
+        for key in missing:
+            self._cache[key] = found.get(key, self.default)
+
+    def load(self, key: Hashable):
+        return self.load_many([key])[0]
+
+    def load_many(self, keys: Iterable[Hashable]) -> list:
+        keys = list(keys)
+        for key in keys:
+            self.defer(key)
+        self.dispatch()
+        return [self._cache[key] for key in keys]
+
+
+class Loaders:
+    """
+    The set of data loaders for one request, sharing one pooled connection.
+
+    The connection is only taken from the pool when the first batch runs and is
+    released by `close`.
+    """
+
+    def __init__(self):
+        self._conn = None
+        self.users = DataLoader(self._batch_users)
+        self.posts = DataLoader(self._batch_posts)
+        self.vote_counts = DataLoader(self._batch_vote_counts, default=0)
+
+    def _fetch(self, query: str, keys: list) -> list:
+        if self._conn is None:
+            self._conn = database.get_connection()
+        cursor = self._conn.cursor()
+        try:
+            cursor.execute(query, (keys,))
+            return cursor.fetchall()
+        finally:
+            cursor.close()
+
+    def _batch_users(self, ids: list) -> dict:
+        rows = self._fetch("SELECT id, email, created_at FROM users WHERE id = ANY(%s)", ids)
+        return {row["id"]: row for row in rows}
+
+    def attach_owners(self, rows: list) -> list:
+        """
+        Adds owner_email and owner_created_at to post rows fetched from shard nodes.
+
+        Owners live on the primary, so they are fetched with one batched users query.
+        """
+        owners = dict(zip(
+            (row["owner_id"] for row in rows),
+            self.users.load_many(row["owner_id"] for row in rows)
+        ))
+        for row in rows:
+            owner = owners[row["owner_id"]] or {}
+            row["owner_email"] = owner.get("email")
+            row["owner_created_at"] = owner.get("created_at")
+        return rows
+
+    def _batch_posts(self, ids: list) -> dict:
+        if settings.sharding_enabled:
+            posts = sharding.get_posts_by_id(ids)
+            self.attach_owners(list(posts.values()))
+            for post in posts.values():
+                self.vote_counts.prime(post["id"], post["votes"])
+            return posts
+
+        rows = self._fetch(POSTS_BY_ID_QUERY, ids)
+        for row in rows:
+            # The owner and vote count come along for free, so share them with the other loaders
+            self.users.prime(row["owner_id"], {
+                "id": row["owner_id"],
+                "email": row["owner_email"],
+                "created_at": row["owner_created_at"],
+            })
+            self.vote_counts.prime(row["id"], row["votes"])
+        return {row["id"]: row for row in rows}
+
+    def _batch_vote_counts(self, post_ids: list) -> dict:
+        if settings.sharding_enabled:
+            return sharding.get_vote_counts(post_ids)
+        rows = self._fetch(
+            "SELECT post_id, count(*) AS votes FROM votes WHERE post_id = ANY(%s) GROUP BY post_id",
+            post_ids,
+        )
+        return {row["post_id"]: row["votes"] for row in rows}
+
+    def close(self):
+        if self._conn is not None:
+            database.release_connection(self._conn)
+            self._conn = None
+
+
+def get_loaders():
+    """
+    FastAPI dependency providing request-scoped loaders.
+
+    FastAPI caches dependencies per request, so every handler and sub-dependency
+    asking for `get_loaders` in the same request shares the same loaders.
+    """
+    loaders = Loaders()
+    try:
+        yield loaders
+    finally:
+        loaders.close()
+
+
+def parse_ids(ids: str) -> List[int]:
+    """
+    Parses a comma-separated `ids` query parameter such as "1,2,3".
+
+    Duplicates are dropped while keeping the requested order.
+
+    Raises:
+        HTTPException: 422 if an id is not an integer or too many ids are requested.
+    """
+    try:
+        parsed = [int(part) for part in ids.split(",") if part.strip()]
+    except ValueError:
+        raise HTTPException(
+            status_code=status.HTTP_422_UNPROCESSABLE_ENTITY,
+            detail="ids must be a comma-separated list of integers"
+        )
+    parsed = list(dict.fromkeys(parsed))
+    if len(parsed) > MAX_BATCH_IDS:
+        raise HTTPException(
+            status_code=status.HTTP_422_UNPROCESSABLE_ENTITY,
+            detail=f"At most {MAX_BATCH_IDS} ids can be requested at once"
+        )
+    return parsed
@@ -1,7 +1,11 @@
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
-from .routers import post, user, auth, vote
+from .routers import post, user, auth, vote, admin
 from .models import create_tables  # Import the function to create tables
+from .compression import CompressionMiddleware, CompressionPolicy, PrecompressedCache
+from .profiling import ProfilingMiddleware, sampler
+from .sharding import create_shard_tables
+from .config import settings
 
 app = FastAPI()
 
@@ -15,16 +19,47 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+# Configure response compression.
+# The shared post listing is the largest payload that many clients request alike, so its
+# compressed variants are cached; per-user pages such as /posts/mine are not.
+# Auth responses carry secrets and are never compressed (avoids BREACH-style attacks).
+app.add_middleware(
+    CompressionMiddleware,
+    minimum_size=settings.compression_minimum_size,
+    offload_size=settings.compression_offload_size,
+    cache=PrecompressedCache(
+        max_entries=settings.compression_cache_entries,
+        max_bytes=settings.compression_cache_bytes,
+    ),
+    route_policies={
+        "/posts/": CompressionPolicy(cache=True, exact=True),
+        "/login": CompressionPolicy(enabled=False),
+        "/token": CompressionPolicy(enabled=False),
+    },
+)
+
+# Per-request profiling for requests with a signed X-Profile header
+app.add_middleware(ProfilingMiddleware)
+
 # Register routers
 app.include_router(post.router)
 app.include_router(user.router)
 app.include_router(auth.router)
 app.include_router(vote.router)
+app.include_router(admin.router)
 
 # Create tables on startup
 @app.on_event("startup")
 def startup_event():
     create_tables()  # Ensures tables are created if they don't exist
+    if settings.sharding_enabled:
+        create_shard_tables()  # Same for the posts and votes tables on every shard node
+    if settings.profiling_sampler_enabled:
+        sampler.start()
+
+@app.on_event("shutdown")
+def shutdown_event():
+    sampler.stop()
 
 # Root endpoint
 @app.get("/")
@@ -1,6 +1,11 @@
+import argparse
+import re
+
 import psycopg2
 from psycopg2.extras import RealDictCursor
-from .database import get_connection
+from .database import get_connection, release_connection
+from .config import settings
+from .partitions import create_vote_partitions, ensure_post_partitions
 
 # Define SQL statements for table creation
 TABLES = {
@@ -31,15 +36,96 @@ TABLES = {
             FOREIGN KEY (user_id) REFERENCES users (id) ON DELETE CASCADE,
             FOREIGN KEY (post_id) REFERENCES posts (id) ON DELETE CASCADE
         )
+    """,
+    # One row per refresh-token session; the secret rotates in place on every refresh.
+    # Only SHA-256 hashes of secrets are stored (32 bytes each) to keep rows compact.
+    "sessions": """
+        CREATE TABLE IF NOT EXISTS sessions (
+            id BIGSERIAL PRIMARY KEY,
+            user_id INTEGER NOT NULL,
+            token_hash BYTEA NOT NULL,
+            previous_hash BYTEA,
+            created_at TIMESTAMPTZ NOT NULL DEFAULT NOW(),
+            last_used_at TIMESTAMPTZ,
+            expires_at TIMESTAMPTZ NOT NULL,
+            revoked_at TIMESTAMPTZ,
+            FOREIGN KEY (user_id) REFERENCES users (id) ON DELETE CASCADE
+        )
+    """
+}
+
+# Partitioned variants used when settings.database_partitioning is enabled.
+# A partitioned table's primary key must contain the partition key, so posts are keyed by
+# (id, created_at) and votes can no longer reference posts with a foreign key; deleting a
+# post removes its votes explicitly instead (see routers/post.py and app/partitions.py).
+PARTITIONED_TABLES = {
+    "users": TABLES["users"],
+    "posts": """
+        CREATE TABLE IF NOT EXISTS posts (
+            id SERIAL,
+            title VARCHAR(255) NOT NULL,
+            content TEXT NOT NULL,
+            published BOOLEAN NOT NULL DEFAULT TRUE,
+            created_at TIMESTAMPTZ NOT NULL DEFAULT NOW(),
+            owner_id INTEGER NOT NULL,
+            PRIMARY KEY (id, created_at),
+            FOREIGN KEY (owner_id) REFERENCES users (id) ON DELETE CASCADE
+        ) PARTITION BY RANGE (created_at)
+    """,
+    "votes": """
+        CREATE TABLE IF NOT EXISTS votes (
+            user_id INTEGER NOT NULL,
+            post_id INTEGER NOT NULL,
+            PRIMARY KEY (user_id, post_id),
+            FOREIGN KEY (user_id) REFERENCES users (id) ON DELETE CASCADE
+        ) PARTITION BY HASH (post_id)
+    """,
+    "sessions": TABLES["sessions"]
+}
+
+# Define SQL statements for index creation, run after the tables exist.
+# create_tables only builds them on tables it has just created. On existing tables a plain
+# CREATE INDEX would block writes while it runs, so missing indexes are built with
+# `python -m app.models create-indexes` (CREATE INDEX CONCURRENTLY) instead.
+INDEXES = {
+    # Covers per-owner listings: the keyset page of (created_at, id) for one owner
+    # is read from this index alone, newest first.
+    "posts_owner_created_at_idx": """
+        CREATE INDEX IF NOT EXISTS posts_owner_created_at_idx
+        ON posts (owner_id, created_at DESC, id DESC)
+    """,
+    # Serves the newest-first listing of all posts and its keyset cursor
+    "posts_created_at_idx": """
+        CREATE INDEX IF NOT EXISTS posts_created_at_idx ON posts (created_at DESC, id DESC)
+    """,
+    # The votes primary key starts with user_id, so counting votes per post needs its own index
+    "votes_post_id_idx": """
+        CREATE INDEX IF NOT EXISTS votes_post_id_idx ON votes (post_id)
+    """,
+    # Bulk revocation of a user's sessions only needs to find the active ones
+    "sessions_user_id_active_idx": """
+        CREATE INDEX IF NOT EXISTS sessions_user_id_active_idx
+        ON sessions (user_id) WHERE revoked_at IS NULL
     """
 }
 
+INDEX_STATEMENT = re.compile(r"CREATE INDEX IF NOT EXISTS (\w+)\s+ON (\w+) (.+)", re.S)
+
+
+def index_table(statement: str) -> str:
+    """Returns the table an INDEXES statement builds its index on."""
+    return INDEX_STATEMENT.search(statement).group(2)
+
+
 def create_tables():
     """
     Establishes database connection and creates necessary tables.
     
-    Loops through TABLES dictionary to execute each table's creation SQL
-    statement if it does not exist. Commits the transaction on success or 
+    Loops through TABLES dictionary (PARTITIONED_TABLES when partitioning is
+    enabled) to execute each table's creation SQL statement if it does not exist,
+    creates the partitions, then creates the indexes in INDEXES on the tables that did
+    not exist before. Missing indexes on existing tables are reported, not built (see
+    `create_indexes_concurrently`). Commits the transaction on success or 
     rolls back on failure. Closes connection resources at the end.
     """
     conn = None
@@ -49,10 +135,29 @@ def create_tables():
         with get_connection() as conn:
             cursor = conn.cursor()
 
-            # Execute each table creation SQL statement
-            for table_name, create_statement in TABLES.items():
+            # Execute each table creation SQL statement, remembering which tables are new
+            tables = PARTITIONED_TABLES if settings.database_partitioning else TABLES
+            new_tables = set()
+            for table_name, create_statement in tables.items():
+                cursor.execute("SELECT to_regclass(%s) IS NULL AS missing", (table_name,))
+                if cursor.fetchone()["missing"]:
+                    new_tables.add(table_name)
                 cursor.execute(create_statement)
 
+            # Create the votes hash partitions and the upcoming posts partitions
+            if settings.database_partitioning:
+                create_vote_partitions(cursor)
+                ensure_post_partitions(cursor)
+
+            # Execute each index creation SQL statement on the new tables
+            for index_name, create_statement in INDEXES.items():
+                if index_table(create_statement) in new_tables:
+                    cursor.execute(create_statement)
+                    continue
+                cursor.execute("SELECT to_regclass(%s) IS NULL AS missing", (index_name,))
+                if cursor.fetchone()["missing"]:
+                    print(f"Index {index_name} is missing, build it with: python -m app.models create-indexes")
+
             # Commit the transaction
             conn.commit()
     
@@ -67,3 +172,84 @@ def create_tables():
             cursor.close()
         if conn is not None:
             conn.close()
+
+
+def _build_index_concurrently(cursor, name: str, table: str, definition: str):
+    # A failed concurrent build leaves an invalid index behind, which IF NOT EXISTS would keep
+    cursor.execute("SELECT indisvalid FROM pg_index WHERE indexrelid = to_regclass(%s)", (name,))
+    row = cursor.fetchone()
+    if row is not None and row["indisvalid"]:
+        return
+    if row is not None:
+        cursor.execute(f"DROP INDEX CONCURRENTLY {name}")
+    cursor.execute(f"CREATE INDEX CONCURRENTLY {name} ON {table} {definition}")
+
+
+def create_indexes_concurrently(conn) -> list:
+    """
+    Builds the missing indexes in INDEXES without blocking writes, for existing deployments.
+
+    Plain tables get CREATE INDEX CONCURRENTLY. Partitioned tables do not support it, so the
+    index is created on the parent only, built concurrently on every partition and attached.
+
+    Args:
+        conn: Connection to use; it must not be inside a transaction.
+
+    Returns:
+        list: Names of the indexes that were checked or built.
+    """
+    conn.autocommit = True  # CREATE INDEX CONCURRENTLY cannot run inside a transaction
+    cursor = conn.cursor()
+    try:
+        for name, statement in INDEXES.items():
+            _, table, definition = INDEX_STATEMENT.search(statement).groups()
+            definition = " ".join(definition.split())
+            cursor.execute("SELECT relkind FROM pg_class WHERE oid = to_regclass(%s)", (table,))
+            if cursor.fetchone()["relkind"] != "p":
+                _build_index_concurrently(cursor, name, table, definition)
+                continue
+
+            cursor.execute(f"CREATE INDEX IF NOT EXISTS {name} ON ONLY {table} {definition}")
+            cursor.execute(
+                """
+                SELECT c.relname AS partition,
+                       EXISTS (SELECT 1 FROM pg_inherits ii
+                               WHERE ii.inhparent = to_regclass(%s)
+                                 AND ii.inhrelid IN (SELECT indexrelid FROM pg_index WHERE indrelid = c.oid))
+                           AS attached
+                FROM pg_inherits i
+                JOIN pg_class c ON c.oid = i.inhrelid
+                WHERE i.inhparent = to_regclass(%s)
+                """,
+                (name, table)
+            )
+            for row in cursor.fetchall():
+                if row["attached"]:
+                    continue
+                partition_index = f"{row['partition']}_{name}"[:63]
+                _build_index_concurrently(cursor, partition_index, row["partition"], definition)
+                cursor.execute(f"ALTER INDEX {name} ATTACH PARTITION {partition_index}")
+        return list(INDEXES)
+    finally:
+        cursor.close()
+        conn.autocommit = False
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Manage the database schema.")
+    parser.add_argument("command", choices=["create-tables", "create-indexes"])
+    args = parser.parse_args()
+
+    if args.command == "create-tables":
+        create_tables()
+        return
+
+    conn = get_connection()
+    try:
+        print(create_indexes_concurrently(conn))
+    finally:
+        release_connection(conn)
+
+
+if __name__ == "__main__":
+    main()
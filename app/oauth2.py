@@ -90,4 +90,23 @@ def get_current_user(token: str = Depends(oauth2_scheme)):
             cursor.close()
         database.release_connection(db_conn)
 
+def get_current_admin(current_user: dict = Depends(get_current_user)):
+    """
+    Retrieves the current user and checks that they are an admin.
+
+    Args:
+        current_user (dict): The authenticated user.
+
+    Returns:
+        dict: User information from the database.
 
+    Raises:
+        HTTPException: If the user's email is not listed in settings.admin_emails.
+    """
+    admins = {email.strip().lower() for email in settings.admin_emails.split(",") if email.strip()}
+    if current_user["email"].lower() not in admins:
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail="Not authorized to perform the requested action"
+        )
+    return current_user
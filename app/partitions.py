@@ -0,0 +1,264 @@
+"""
+Partition maintenance for the partitioned schema (settings.database_partitioning).
+
+Posts are range-partitioned by created_at month (posts_y2024m11, ...), votes are
+hash-partitioned by post_id (votes_p0 ... votes_p{N-1}). This module pre-creates
+future post partitions and archives old ones: an archived month is detached,
+exported together with its votes to gzip-compressed CSV files, and dropped.
+
+Posts whose month has no partition yet land in the posts_default partition, so inserts
+keep working if maintenance falls behind; the next `ensure` moves them into their month.
+The app only ensures partitions at startup, so run maintenance on a schedule, e.g. daily
+from cron:
+
+    15 3 * * * cd /app && python -m app.partitions maintain
+
+Usage:
+    python -m app.partitions maintain
+    python -m app.partitions archive --retention-months 12 --archive-dir /var/backups/posts
+"""
+import argparse
+import gzip
+import os
+import re
+import time
+from datetime import date, datetime, timezone
+from typing import List
+
+from psycopg2 import errors
+
+from . import database
+from .config import settings
+
+PARTITION_NAME = re.compile(r"^posts_y(\d{4})m(\d{2})$")
+DEFAULT_PARTITION = "posts_default"
+
+
+def month_start(day: date) -> date:
+    return day.replace(day=1)
+
+
+def add_months(month: date, months: int) -> date:
+    index = month.year * 12 + (month.month - 1) + months
+    return date(index // 12, index % 12 + 1, 1)
+
+
+def partition_name(month: date) -> str:
+    return f"posts_y{month.year:04d}m{month.month:02d}"
+
+
+def partition_month(name: str) -> date:
+    year, month = PARTITION_NAME.match(name).groups()
+    return date(int(year), int(month), 1)
+
+
+def create_vote_partitions(cursor, modulus: int = settings.votes_partitions):
+    """
+    Creates the hash partitions of the votes table.
+
+    The modulus is fixed once the partitions exist; changing it requires rebuilding the table.
+    """
+    for remainder in range(modulus):
+        cursor.execute(
+            f"CREATE TABLE IF NOT EXISTS votes_p{remainder} PARTITION OF votes "
+            f"FOR VALUES WITH (MODULUS {modulus}, REMAINDER {remainder})"
+        )
+
+
+def ensure_post_partitions(cursor, months_ahead: int = settings.partition_months_ahead, today: date = None):
+    """
+    Creates the default posts partition and the monthly partitions from the current month
+    to `months_ahead` months ahead.
+
+    A missing month is created as a plain table, filled with the month's rows from the
+    default partition and then attached, so rows inserted while the month had no partition
+    are moved into it.
+
+    Returns:
+        List[str]: Names of the partitions that were checked or created.
+    """
+    today = today or datetime.now(timezone.utc).date()
+    cursor.execute(f"CREATE TABLE IF NOT EXISTS {DEFAULT_PARTITION} PARTITION OF posts DEFAULT")
+    names = []
+    first = month_start(today)
+    for offset in range(months_ahead + 1):
+        month = add_months(first, offset)
+        name = partition_name(month)
+        bounds = (month.isoformat(), add_months(month, 1).isoformat())
+        names.append(name)
+        cursor.execute("SELECT to_regclass(%s) IS NOT NULL AS present", (name,))
+        if cursor.fetchone()["present"]:
+            continue
+        cursor.execute(f"CREATE TABLE {name} (LIKE posts INCLUDING DEFAULTS INCLUDING CONSTRAINTS)")
+        cursor.execute(
+            f"""
+            WITH moved AS (
+                DELETE FROM {DEFAULT_PARTITION} WHERE created_at >= %s AND created_at < %s RETURNING *
+            )
+            INSERT INTO {name} SELECT * FROM moved
+            """,
+            bounds
+        )
+        cursor.execute(f"ALTER TABLE posts ATTACH PARTITION {name} FOR VALUES FROM (%s) TO (%s)", bounds)
+    return names
+
+
+def list_post_partitions(cursor) -> List[str]:
+    """
+    Returns the names of the monthly partitions currently attached to posts, oldest first.
+    """
+    cursor.execute(
+        """
+        SELECT c.relname AS name
+        FROM pg_inherits i
+        JOIN pg_class c ON c.oid = i.inhrelid
+        WHERE i.inhparent = 'posts'::regclass
+        """
+    )
+    return sorted(row["name"] for row in cursor.fetchall() if PARTITION_NAME.match(row["name"]))
+
+
+def list_detached_post_partitions(cursor) -> List[str]:
+    """
+    Returns the names of monthly partitions that were detached but not archived yet, oldest first.
+    """
+    cursor.execute(
+        """
+        SELECT relname AS name
+        FROM pg_class
+        WHERE relkind = 'r' AND NOT relispartition
+          AND relnamespace = current_schema()::regnamespace
+        """
+    )
+    return sorted(row["name"] for row in cursor.fetchall() if PARTITION_NAME.match(row["name"]))
+
+
+def _export(cursor, query: str, path: str):
+    with gzip.open(path, "wb") as archive:
+        cursor.copy_expert(f"COPY ({query}) TO STDOUT WITH (FORMAT csv, HEADER)", archive)
+
+
+def _detach(conn, cursor, name: str, lock_timeout: str, attempts: int) -> bool:
+    """
+    Detaches a posts partition and commits, giving up after `attempts` lock timeouts.
+
+    DETACH PARTITION needs an ACCESS EXCLUSIVE lock on posts. While it waits for a long
+    running query to finish, every later query on posts queues behind it, so the wait is
+    bounded by lock_timeout and retried after a pause instead.
+    """
+    for attempt in range(attempts):
+        try:
+            cursor.execute("SET LOCAL lock_timeout = %s", (lock_timeout,))
+            cursor.execute(f"ALTER TABLE posts DETACH PARTITION {name}")
+            conn.commit()
+            return True
+        except errors.LockNotAvailable:
+            conn.rollback()
+            if attempt + 1 < attempts:
+                time.sleep(2 ** attempt)
+    return False
+
+
+def archive_post_partitions(
+    conn,
+    retention_months: int = settings.partition_retention_months,
+    archive_dir: str = settings.partition_archive_dir,
+    today: date = None,
+    lock_timeout: str = settings.partition_lock_timeout,
+    attempts: int = 3,
+) -> List[str]:
+    """
+    Detaches, exports and drops posts partitions older than the retention window.
+
+    DETACH PARTITION locks the whole posts table, so it waits at most `lock_timeout` for the
+    lock (see `_detach`) and is committed on its own before the slow part starts. A partition
+    that cannot be detached is skipped and left for the next run. Then the partition's rows and the votes on its posts are written to
+    <archive_dir>/<partition>.posts.csv.gz and <archive_dir>/<partition>.votes.csv.gz, the
+    votes are deleted and the partition is dropped in a second transaction. If that fails,
+    the partition is attached again. Partitions left detached by an interrupted run are
+    picked up by the next one.
+
+    Returns:
+        List[str]: Names of the archived partitions.
+    """
+    today = today or datetime.now(timezone.utc).date()
+    cutoff = partition_name(add_months(month_start(today), -retention_months))
+    os.makedirs(archive_dir, exist_ok=True)
+
+    cursor = conn.cursor()
+    archived = []
+    try:
+        # Partition names sort chronologically
+        expired = [name for name in list_post_partitions(cursor) if name < cutoff]
+        leftover = [name for name in list_detached_post_partitions(cursor) if name < cutoff]
+        for name in sorted(leftover + expired):
+            if name in expired and not _detach(conn, cursor, name, lock_timeout, attempts):
+                print(f"Skipped {name}: posts stayed locked for {attempts} attempts")
+                continue
+            try:
+                _export(cursor, f"SELECT * FROM {name} ORDER BY id", os.path.join(archive_dir, f"{name}.posts.csv.gz"))
+                votes_query = f"SELECT * FROM votes WHERE post_id IN (SELECT id FROM {name})"
+                _export(cursor, votes_query, os.path.join(archive_dir, f"{name}.votes.csv.gz"))
+                cursor.execute(f"DELETE FROM votes WHERE post_id IN (SELECT id FROM {name})")
+                cursor.execute(f"DROP TABLE {name}")
+                conn.commit()
+                archived.append(name)
+            except Exception:
+                conn.rollback()
+                month = partition_month(name)
+                cursor.execute(
+                    f"ALTER TABLE posts ATTACH PARTITION {name} FOR VALUES FROM (%s) TO (%s)",
+                    (month.isoformat(), add_months(month, 1).isoformat())
+                )
+                conn.commit()
+                raise
+    finally:
+        cursor.close()
+    return archived
+
+
+def maintain(months_ahead: int = settings.partition_months_ahead,
+             retention_months: int = settings.partition_retention_months,
+             archive_dir: str = settings.partition_archive_dir) -> dict:
+    """
+    Runs one maintenance pass: pre-creates future partitions, then archives expired ones.
+    """
+    conn = database.get_connection()
+    try:
+        cursor = conn.cursor()
+        created = ensure_post_partitions(cursor, months_ahead)
+        conn.commit()
+        cursor.close()
+        archived = archive_post_partitions(conn, retention_months, archive_dir)
+        return {"ensured": created, "archived": archived}
+    finally:
+        database.release_connection(conn)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Maintain posts partitions.")
+    parser.add_argument("command", choices=["maintain", "ensure", "archive"])
+    parser.add_argument("--months-ahead", type=int, default=settings.partition_months_ahead)
+    parser.add_argument("--retention-months", type=int, default=settings.partition_retention_months)
+    parser.add_argument("--archive-dir", default=settings.partition_archive_dir)
+    args = parser.parse_args()
+
+    if args.command == "maintain":
+        print(maintain(args.months_ahead, args.retention_months, args.archive_dir))
+        return
+
+    conn = database.get_connection()
+    try:
+        if args.command == "ensure":
+            cursor = conn.cursor()
+            print(ensure_post_partitions(cursor, args.months_ahead))
+            conn.commit()
+            cursor.close()
+        else:
+            print(archive_post_partitions(conn, args.retention_months, args.archive_dir))
+    finally:
+        database.release_connection(conn)
+
+
+if __name__ == "__main__":
+    main()
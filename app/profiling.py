@@ -0,0 +1,400 @@
+"""
+Request profiling.
+
+Two tools share the same instrumentation:
+
+- Per-request profiling: a request carrying a valid signed `X-Profile` header is run under
+  cProfile and the profile is returned instead of the normal response body.
+- Sampling profiler: a background thread periodically samples the stacks of threads that
+  are serving a request and aggregates them per route, for flamegraphs.
+
+Sync endpoints, their dependencies and response validation run in the threadpool, so
+`ProfiledRoute` wraps those calls to enable the request's profiler in whichever thread runs
+them and to record which route each thread is serving.
+
+From Python 3.12 cProfile is built on sys.monitoring: an enabled profile records every thread
+of the process, and only one can be enabled at a time. There the profile is enabled once for
+the whole request instead, so it also contains the work of requests served concurrently. The
+response is labelled with `X-Profile-Scope: process` and the number of overlapping requests;
+profile under low traffic, or on a dedicated worker, for a clean profile.
+"""
+import cProfile
+import functools
+import hashlib
+import hmac
+import inspect
+import io
+import marshal
+import os
+import pstats
+import sys
+import threading
+import time
+from collections import Counter
+from contextvars import ContextVar
+from typing import Dict, Optional
+
+from fastapi.routing import APIRoute
+from starlette.datastructures import Headers, MutableHeaders
+
+from .config import settings
+
+PROFILE_HEADER = "x-profile"
+PROFILE_FORMAT_HEADER = "x-profile-format"
+MAX_PROFILE_TOKEN_TTL = 3600
+
+# cProfile profiles every thread at once from Python 3.12 (see the module docstring)
+PROCESS_WIDE_PROFILER = sys.version_info >= (3, 12)
+
+# cProfile profile of the current request, if it opted in
+_request_profile: ContextVar[Optional[cProfile.Profile]] = ContextVar("request_profile", default=None)
+
+# Thread id -> route path, for threads currently running instrumented request code
+_active_threads: Dict[int, str] = {}
+
+
+def _sign(expires: int) -> str:
+    message = f"profile:{expires}".encode()
+    return hmac.new(settings.secret_key.encode(), message, hashlib.sha256).hexdigest()
+
+
+def create_profile_token(ttl_seconds: int = 300) -> str:
+    """
+    Creates a value for the X-Profile header that is valid for `ttl_seconds`.
+    """
+    expires = int(time.time()) + min(ttl_seconds, MAX_PROFILE_TOKEN_TTL)
+    return f"{expires}.{_sign(expires)}"
+
+
+def verify_profile_token(token: str) -> bool:
+    expires, _, signature = token.partition(".")
+    # isdigit() alone also accepts non-ASCII digits such as "¹", which int() rejects
+    if not (expires.isascii() and expires.isdigit()) or int(expires) < time.time():
+        return False
+    return hmac.compare_digest(signature, _sign(int(expires)))
+
+
+class _InstrumentedCall:
+    """
+    Wrapper around a sync dependency, endpoint or validator that records the thread's route
+    and enables the request's profile while the call runs.
+
+    The wrapper hashes and compares equal to the wrapped callable: FastAPI looks dependency
+    overrides up by the dependency's callable at request time, so
+    `app.dependency_overrides[original]` keeps applying to instrumented dependencies.
+    """
+
+    def __init__(self, call, route: str):
+        functools.update_wrapper(self, call)
+        self.call = call
+        self.route = route
+
+    def __call__(self, *args, **kwargs):
+        ident = threading.get_ident()
+        _active_threads[ident] = self.route
+        # A process-wide profile is already enabled by ProfilingMiddleware
+        profile = None if PROCESS_WIDE_PROFILER else _request_profile.get()
+        if profile is not None:
+            profile.enable()
+        try:
+            return self.call(*args, **kwargs)
+        finally:
+            if profile is not None:
+                profile.disable()
+            _active_threads.pop(ident, None)
+
+    def __eq__(self, other):
+        if isinstance(other, _InstrumentedCall):
+            other = other.call
+        return self.call == other
+
+    def __hash__(self):
+        return hash(self.call)
+
+
+class ProfiledRoute(APIRoute):
+    """
+    APIRoute that instruments the endpoint, its plain sync dependencies and response validation.
+
+    Dependency overrides still apply, whether they are registered before or after the route
+    is created (see `_InstrumentedCall`).
+    """
+
+    def __init__(self, path: str, endpoint, **kwargs):
+        super().__init__(path, endpoint, **kwargs)
+        wrappers = {}
+
+        def instrument(call):
+            if call not in wrappers:
+                wrappers[call] = _InstrumentedCall(call, self.path_format)
+            return wrappers[call]
+
+        stack = [self.dependant]
+        while stack:
+            dependant = stack.pop()
+            call = dependant.call
+            if inspect.isfunction(call) and not (
+                inspect.iscoroutinefunction(call) or inspect.isgeneratorfunction(call)
+            ):
+                dependant.call = instrument(call)
+            stack.extend(dependant.dependencies)
+
+        response_field = getattr(self, "secure_cloned_response_field", None) or self.response_field
+        if response_field is not None:
+            response_field.validate = _InstrumentedCall(response_field.validate, self.path_format)
+
+
+class ProfilingMiddleware:
+    """
+    ASGI middleware that runs requests with a valid signed X-Profile header under cProfile.
+
+    The response body is replaced by the profile: a plain-text pstats report by default, or
+    a binary pstats dump (loadable with pstats/snakeviz) with `X-Profile-Format: pstats`.
+    Only one request is profiled at a time; while one is running, other profiled requests
+    are served normally with `X-Profile-Status: busy`. `X-Profile-Scope` tells whether the
+    profile covers only this request's threads or the whole process, and
+    `X-Profile-Overlapping-Requests` how many other requests ran while it was recorded.
+    """
+
+    def __init__(self, app):
+        self.app = app
+        self._lock = threading.Lock()
+        # Requests in flight and started so far, to count requests overlapping a profile
+        self._in_flight = 0
+        self._started = 0
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        self._in_flight += 1
+        self._started += 1
+        try:
+            await self._dispatch(scope, receive, send)
+        finally:
+            self._in_flight -= 1
+
+    async def _dispatch(self, scope, receive, send):
+        headers = Headers(scope=scope)
+        token = headers.get(PROFILE_HEADER)
+        if not token or not verify_profile_token(token):
+            await self.app(scope, receive, send)
+            return
+
+        if not self._lock.acquire(blocking=False):
+            await self.app(scope, receive, self._with_header(send, "X-Profile-Status", "busy"))
+            return
+
+        try:
+            await self._profile(scope, receive, send, headers.get(PROFILE_FORMAT_HEADER, "text"))
+        finally:
+            self._lock.release()
+
+    @staticmethod
+    def _with_header(send, name: str, value: str):
+        async def send_wrapper(message):
+            if message["type"] == "http.response.start":
+                MutableHeaders(raw=message["headers"])[name] = value
+            await send(message)
+        return send_wrapper
+
+    async def _profile(self, scope, receive, send, output_format: str):
+        profile = cProfile.Profile()
+        status_code = 500
+
+        async def capture(message):
+            # The profile replaces the response, only the original status is kept
+            nonlocal status_code
+            if message["type"] == "http.response.start":
+                status_code = message["status"]
+
+        reset = _request_profile.set(profile)
+        overlapping = self._in_flight - 1 - self._started
+        start = time.perf_counter()
+        if PROCESS_WIDE_PROFILER:
+            profile.enable()
+        try:
+            await self.app(scope, receive, capture)
+        finally:
+            if PROCESS_WIDE_PROFILER:
+                profile.disable()
+            _request_profile.reset(reset)
+        elapsed = time.perf_counter() - start
+        overlapping += self._started
+
+        if output_format == "pstats":
+            profile.create_stats()
+            body = marshal.dumps(profile.stats)
+            content_type = b"application/octet-stream"
+        else:
+            stream = io.StringIO()
+            pstats.Stats(profile, stream=stream).sort_stats("cumulative").print_stats(50)
+            body = stream.getvalue().encode()
+            content_type = b"text/plain; charset=utf-8"
+
+        await send({
+            "type": "http.response.start",
+            "status": 200,
+            "headers": [
+                (b"content-type", content_type),
+                (b"content-length", str(len(body)).encode()),
+                (b"x-profile-original-status", str(status_code).encode()),
+                (b"x-profile-duration-ms", f"{elapsed * 1000:.2f}".encode()),
+                (b"x-profile-scope", b"process" if PROCESS_WIDE_PROFILER else b"thread"),
+                (b"x-profile-overlapping-requests", str(overlapping).encode()),
+            ],
+        })
+        await send({"type": "http.response.body", "body": body})
+
+
+class SamplingProfiler:
+    """
+    Low-overhead sampling profiler aggregating stacks per route.
+
+    Every `interval` seconds the stacks of threads running instrumented request code are
+    read from sys._current_frames(). The time spent sampling is measured, and the sleep
+    between samples is stretched so that sampling never takes more than `max_overhead`
+    of wall time. Each route keeps at most `max_stacks` distinct stacks; further stacks
+    are counted under a single "[truncated]" frame.
+    """
+
+    def __init__(self, interval: float = 0.01, max_overhead: float = 0.01, max_stacks: int = 2000, max_depth: int = 64):
+        self.interval = interval
+        self.max_overhead = max_overhead
+        self.max_stacks = max_stacks
+        self.max_depth = max_depth
+        self._lock = threading.Lock()
+        self._thread = None
+        self._stop = threading.Event()
+        self.reset()
+
+    def reset(self):
+        with self._lock:
+            self._stacks: Dict[str, Counter] = {}
+            self.samples = 0
+            self.sampling_seconds = 0.0
+            self.started_at = time.perf_counter()
+
+    def start(self):
+        if self._thread is not None:
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name="sampling-profiler", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+
+    def _run(self):
+        while not self._stop.is_set():
+            start = time.perf_counter()
+            self.sample()
+            cost = time.perf_counter() - start
+            # Keep cost / (cost + sleep) <= max_overhead
+            self._stop.wait(max(self.interval, cost * (1 - self.max_overhead) / self.max_overhead))
+
+    def sample(self):
+        start = time.perf_counter()
+        own = threading.get_ident()
+        frames = sys._current_frames()
+        with self._lock:
+            for ident, route in list(_active_threads.items()):
+                frame = frames.get(ident)
+                if frame is None or ident == own:
+                    continue
+                stack = []
+                while frame is not None and len(stack) < self.max_depth:
+                    code = frame.f_code
+                    stack.append((code.co_name, code.co_filename, code.co_firstlineno))
+                    frame = frame.f_back
+                stack = tuple(reversed(stack))
+
+                counter = self._stacks.setdefault(route, Counter())
+                if stack not in counter and len(counter) >= self.max_stacks:
+                    stack = (("[truncated]", "", 0),)
+                counter[stack] += 1
+                self.samples += 1
+            self.sampling_seconds += time.perf_counter() - start
+
+    def stats(self) -> dict:
+        with self._lock:
+            wall = time.perf_counter() - self.started_at
+            return {
+                "running": self._thread is not None,
+                "interval_ms": self.interval * 1000,
+                "max_overhead": self.max_overhead,
+                "samples": self.samples,
+                "sampling_seconds": self.sampling_seconds,
+                "overhead": self.sampling_seconds / wall if wall else 0.0,
+                "routes": {route: sum(counter.values()) for route, counter in self._stacks.items()},
+            }
+
+    def _snapshot(self, route: Optional[str]) -> Dict[str, Counter]:
+        with self._lock:
+            if route is not None:
+                return {route: Counter(self._stacks.get(route, {}))}
+            return {name: Counter(counter) for name, counter in self._stacks.items()}
+
+    @staticmethod
+    def _frame_label(frame) -> str:
+        name, filename, line = frame
+        return f"{name} ({os.path.basename(filename)}:{line})" if filename else name
+
+    def collapsed(self, route: Optional[str] = None) -> str:
+        """
+        Returns the stacks in the folded format used by flamegraph.pl and speedscope.
+
+        Without a route, stacks of all routes are returned under a root frame per route.
+        """
+        lines = []
+        for name, counter in self._snapshot(route).items():
+            for stack, count in counter.most_common():
+                labels = [self._frame_label(frame) for frame in stack]
+                if route is None:
+                    labels.insert(0, name)
+                lines.append(f"{';'.join(labels)} {count}")
+        return "\n".join(lines) + "\n"
+
+    def speedscope(self, route: Optional[str] = None) -> dict:
+        """
+        Returns the stacks as a speedscope file with one sampled profile per route.
+        """
+        frames, frame_index, profiles = [], {}, []
+        for name, counter in self._snapshot(route).items():
+            samples, weights = [], []
+            for stack, count in counter.most_common():
+                indexes = []
+                for frame in stack:
+                    if frame not in frame_index:
+                        frame_index[frame] = len(frames)
+                        function, filename, line = frame
+                        frames.append({"name": function, "file": filename, "line": line})
+                    indexes.append(frame_index[frame])
+                samples.append(indexes)
+                weights.append(count)
+            profiles.append({
+                "type": "sampled",
+                "name": name,
+                "unit": "none",
+                "startValue": 0,
+                "endValue": sum(weights),
+                "samples": samples,
+                "weights": weights,
+            })
+        return {
+            "$schema": "https://www.speedscope.app/file-format-schema.json",
+            "shared": {"frames": frames},
+            "profiles": profiles,
+            "name": route or "all routes",
+            "exporter": "app.profiling",
+        }
+
+
+sampler = SamplingProfiler(
+    interval=settings.profiling_sample_interval_ms / 1000,
+    max_overhead=settings.profiling_max_overhead,
+)
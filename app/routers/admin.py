@@ -0,0 +1,57 @@
+from fastapi import APIRouter, Depends, Response, status
+from fastapi.responses import PlainTextResponse
+from typing import Optional
+from .. import oauth2
+from ..profiling import create_profile_token, sampler
+
+# Admin-only endpoints for the profiling tools in app/profiling.py
+router = APIRouter(
+    prefix="/admin/profiling",
+    tags=["Admin"],
+    dependencies=[Depends(oauth2.get_current_admin)]
+)
+
+
+@router.post("/token")
+def create_token(ttl_seconds: int = 300):
+    """
+    Creates a signed X-Profile header value for per-request profiling.
+
+    Parameters:
+    - ttl_seconds (int): How long the token stays valid (at most one hour).
+
+    Returns:
+    - JSON object with the header name and value to send.
+    """
+    return {"header": "X-Profile", "value": create_profile_token(ttl_seconds)}
+
+
+@router.get("/stats")
+def get_stats():
+    """
+    Returns the sampling profiler's sample counts per route and its measured overhead.
+    """
+    return sampler.stats()
+
+
+@router.get("/flamegraph")
+def get_flamegraph(route: Optional[str] = None, format: str = "speedscope"):
+    """
+    Returns the aggregated stacks of the sampling profiler.
+
+    Parameters:
+    - route (str): Route path to return, e.g. "/posts/". All routes if omitted.
+    - format (str): "speedscope" for a speedscope JSON file, or "collapsed" for folded stacks.
+    """
+    if format == "collapsed":
+        return PlainTextResponse(sampler.collapsed(route))
+    return sampler.speedscope(route)
+
+
+@router.post("/reset", status_code=status.HTTP_204_NO_CONTENT)
+def reset():
+    """
+    Clears the sampling profiler's aggregated stacks.
+    """
+    sampler.reset()
+    return Response(status_code=status.HTTP_204_NO_CONTENT)
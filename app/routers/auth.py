@@ -1,11 +1,12 @@
-from fastapi import APIRouter, Depends, status, HTTPException
+from fastapi import APIRouter, Depends, Response, status, HTTPException
 from fastapi.security.oauth2 import OAuth2PasswordRequestForm
 from psycopg2 import sql
 from psycopg2.extensions import connection as Connection
-from .. import database, schemas, utils, oauth2
+from .. import database, schemas, utils, oauth2, sessions
+from ..profiling import ProfiledRoute
 
 # Initialize APIRouter for authentication-related routes
-router = APIRouter(tags=["Authentication"])
+router = APIRouter(tags=["Authentication"], route_class=ProfiledRoute)
 
 @router.post("/login", response_model=schemas.Token)
 def login(user_credentials: OAuth2PasswordRequestForm = Depends()):
@@ -16,7 +17,7 @@ def login(user_credentials: OAuth2PasswordRequestForm = Depends()):
     - user_credentials (OAuth2PasswordRequestForm): Contains user login credentials (email and password).
     
     Returns:
-    - JSON object with access token and token type.
+    - JSON object with access token, token type and a refresh token.
     """
     try:
         conn = database.get_connection()
@@ -47,11 +48,65 @@ def login(user_credentials: OAuth2PasswordRequestForm = Depends()):
         
         # Generate a JWT access token containing the user ID
         access_token = oauth2.create_access_token(data={"user_id": user_id})
+
+        # Start a session so the client can renew the access token without the password
+        refresh_token = sessions.create_refresh_token(cursor, user_id)
+        conn.commit()
         
-        # Return token as JSON response
-        return {"access_token": access_token, "token_type": "bearer"}
+        # Return tokens as JSON response
+        return {"access_token": access_token, "token_type": "bearer", "refresh_token": refresh_token}
     
     finally:
         # Ensure cursor is closed and connection is released back to the pool
         cursor.close()
         database.release_connection(conn)
+
+
+@router.post("/token/refresh", response_model=schemas.Token)
+def refresh_token(request: schemas.RefreshRequest):
+    """
+    Endpoint to exchange a refresh token for a new access token and a new refresh token.
+
+    No password check is needed, so this avoids a bcrypt verification, and the session is
+    validated and rotated with a single UPDATE by primary key. Reusing an already rotated
+    refresh token revokes the whole session.
+
+    Parameters:
+    - request (schemas.RefreshRequest): Contains the current refresh token.
+
+    Returns:
+    - JSON object with the new access token, token type and new refresh token.
+    """
+    user_id, new_refresh_token = sessions.rotate_refresh_token(request.refresh_token)
+    if user_id is None:
+        raise HTTPException(
+            status_code=status.HTTP_401_UNAUTHORIZED,
+            detail="Invalid refresh token",
+            headers={"WWW-Authenticate": "Bearer"}
+        )
+
+    access_token = oauth2.create_access_token(data={"user_id": user_id})
+    return {"access_token": access_token, "token_type": "bearer", "refresh_token": new_refresh_token}
+
+
+@router.post("/logout", status_code=status.HTTP_204_NO_CONTENT)
+def logout(request: schemas.RefreshRequest):
+    """
+    Endpoint to revoke the session a refresh token belongs to.
+
+    Parameters:
+    - request (schemas.RefreshRequest): Contains the refresh token to revoke.
+    """
+    sessions.revoke_refresh_token(request.refresh_token)
+    return Response(status_code=status.HTTP_204_NO_CONTENT)
+
+
+@router.post("/logout/all")
+def logout_all(current_user: dict = Depends(oauth2.get_current_user)):
+    """
+    Endpoint to revoke every session of the current user.
+
+    Returns:
+    - JSON object with the number of revoked sessions.
+    """
+    return {"revoked": sessions.revoke_user_sessions(current_user["id"])}
@@ -1,129 +1,272 @@
-from fastapi import APIRouter, Depends, HTTPException, Response, status
+import base64
+from datetime import datetime
+from fastapi import APIRouter, Depends, HTTPException, Query, Response, status
 from typing import List, Optional
-from .. import schemas, oauth2, database
+from .. import schemas, oauth2, database, sharding
+from ..loaders import Loaders, get_loaders, parse_ids
+from ..profiling import ProfiledRoute
+from ..config import settings
 
 # Define the API router for posts, with a prefix for all routes
 router = APIRouter(
     prefix="/posts",
-    tags=['Posts']
+    tags=['Posts'],
+    route_class=ProfiledRoute
 )
 
-# Get all posts with optional search, limit, and offset query parameters
+def format_post(post: dict) -> dict:
+    """
+    Transforms a row from the post/owner/votes query into the PostOut shape.
+    """
+    return {
+        "Post": {
+            "id": post["id"],
+            "title": post["title"],
+            "content": post["content"],
+            "published": post["published"],
+            "created_at": post["created_at"],
+            "owner_id": post["owner_id"],
+            "owner": {
+                "id": post["owner_id"],
+                "email": post["owner_email"],
+                "created_at": post["owner_created_at"]
+            }
+        },
+        "votes": post["votes"]
+    }
+
+
+# Listing of posts with their owner and vote count, newest first. Votes are counted in a
+# subquery rather than a join and GROUP BY p.id, since with partitioning enabled id alone
+# is not the primary key of posts and the post columns would no longer be grouped by it.
+POSTS_LISTING_QUERY = """
+    SELECT p.id, p.title, p.content, p.published, p.created_at, p.owner_id,
+           u.email AS owner_email, u.created_at AS owner_created_at,
+           (SELECT count(*) FROM votes v WHERE v.post_id = p.id) AS votes
+    FROM posts p
+    LEFT JOIN users u ON u.id = p.owner_id
+    WHERE p.title ILIKE %(search)s {cursor_filter}
+    ORDER BY p.created_at DESC, p.id DESC
+    LIMIT %(limit)s OFFSET %(skip)s
+"""
+POSTS_CURSOR_FILTER = """
+    AND p.created_at <= %(after_created_at)s
+    AND (p.created_at, p.id) < (%(after_created_at)s, %(after_id)s)
+"""
+
+# Keyset-paginated listing of one owner's posts, newest first.
+# The page CTE is served by posts_owner_created_at_idx alone; only the posts on the
+# page are then read from the heap, and vote counts use votes_post_id_idx.
+# Posts are joined on (id, created_at) so the lookup matches the partitioned key too.
+OWNER_POSTS_QUERY = """
+    WITH page AS (
+        SELECT id, created_at
+        FROM posts
+        WHERE owner_id = %(owner_id)s {cursor_filter}
+        ORDER BY created_at DESC, id DESC
+        LIMIT %(limit)s
+    )
+    SELECT p.id, p.title, p.content, p.published, p.created_at, p.owner_id,
+           u.email AS owner_email, u.created_at AS owner_created_at,
+           (SELECT count(*) FROM votes v WHERE v.post_id = p.id) AS votes
+    FROM page
+    JOIN posts p ON p.id = page.id AND p.created_at = page.created_at
+    JOIN users u ON u.id = p.owner_id
+    {outer_filter}
+    ORDER BY page.created_at DESC, page.id DESC
+"""
+# The plain created_at bound is implied by the row comparison; it is spelled out, on both
+# the page and the outer posts scan, so the planner can prune newer posts partitions
+# when partitioning is enabled.
+OWNER_POSTS_CURSOR_FILTER = """
+    AND created_at <= %(after_created_at)s
+    AND (created_at, id) < (%(after_created_at)s, %(after_id)s)
+"""
+OWNER_POSTS_OUTER_FILTER = "WHERE p.created_at <= %(after_created_at)s"
+
+
+# Lookups and writes of a single post by id. With partitioning enabled they cannot prune by
+# month and probe the primary key index of every attached posts partition.
+POST_BY_ID_QUERY = "SELECT * FROM posts WHERE id = %s"
+UPDATE_POST_QUERY = """
+    UPDATE posts SET title = %s, content = %s WHERE id = %s RETURNING id, title, content, published, created_at, owner_id
+"""
+DELETE_POST_QUERY = "DELETE FROM posts WHERE id = %s"
+DELETE_POST_VOTES_QUERY = "DELETE FROM votes WHERE post_id = %s"
+
+
+def owner_posts_query(after_cursor: bool) -> str:
+    """
+    Returns OWNER_POSTS_QUERY for a first page, or for a page after a cursor.
+    """
+    if not after_cursor:
+        return OWNER_POSTS_QUERY.format(cursor_filter="", outer_filter="")
+    return OWNER_POSTS_QUERY.format(cursor_filter=OWNER_POSTS_CURSOR_FILTER, outer_filter=OWNER_POSTS_OUTER_FILTER)
+
+
+def encode_cursor(created_at: datetime, post_id: int) -> str:
+    """
+    Encodes the position of the last post on a page as an opaque cursor.
+    """
+    raw = f"{created_at.isoformat()}|{post_id}".encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+
+def decode_cursor(cursor: str):
+    """
+    Decodes a cursor produced by encode_cursor.
+
+    Raises:
+        HTTPException: 422 if the cursor is malformed.
+    """
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)).decode()
+        created_at, post_id = raw.rsplit("|", 1)
+        return datetime.fromisoformat(created_at), int(post_id)
+    except ValueError:
+        raise HTTPException(status_code=status.HTTP_422_UNPROCESSABLE_ENTITY, detail="Invalid cursor")
+
+
+def get_owner_posts_page(owner_id: int, limit: int, cursor: Optional[str], loaders: Loaders) -> dict:
+    """
+    Fetches one page of an owner's posts with their vote counts.
+
+    Args:
+        owner_id (int): Owner whose posts are listed.
+        limit (int): Maximum number of posts on the page.
+        cursor (Optional[str]): next_cursor from the previous page, or None for the first page.
+        loaders (Loaders): Request loaders, used for the owner when sharding is enabled.
+
+    Returns:
+        dict: The page in the PostPage shape.
+    """
+    after = decode_cursor(cursor) if cursor else None
+
+    if settings.sharding_enabled:
+        # All of an owner's posts live on the owner's node
+        rows = loaders.attach_owners(sharding.list_owner_posts(owner_id, limit + 1, after))
+    else:
+        params = {"owner_id": owner_id, "limit": limit + 1}
+        if after:
+            params["after_created_at"], params["after_id"] = after
+
+        conn = database.get_connection()
+        try:
+            db_cursor = conn.cursor()
+            db_cursor.execute(owner_posts_query(after is not None), params)
+            rows = db_cursor.fetchall()
+            db_cursor.close()
+        finally:
+            database.release_connection(conn)
+
+    # One extra row was fetched to tell whether another page exists
+    next_cursor = None
+    if len(rows) > limit:
+        rows = rows[:limit]
+        next_cursor = encode_cursor(rows[-1]["created_at"], rows[-1]["id"])
+    return {"items": [format_post(row) for row in rows], "next_cursor": next_cursor}
+
+
+# Get all posts, newest first, with optional search, limit, and offset query parameters.
+# Passing ids (e.g. ?ids=1,2,3) instead fetches exactly those posts in one query.
+# When more posts follow, the X-Next-Cursor response header is set; pass it back as
+# cursor to get the next page. When sharding is enabled, posts are gathered from every node.
 @router.get("/", response_model=List[schemas.PostOut])
 def get_posts(
+    response: Response,
     current_user: int = Depends(oauth2.get_current_user),
     limit: int = 10,
     skip: int = 0,
-    search: Optional[str] = ""
+    search: Optional[str] = "",
+    ids: Optional[str] = None,
+    cursor: Optional[str] = None,
+    loaders: Loaders = Depends(get_loaders)
 ):
-    query = """
-        SELECT p.id, p.title, p.content, p.published, p.created_at, p.owner_id,
-               u.id AS owner_id, u.email AS owner_email, u.created_at AS owner_created_at,
-               COALESCE(count(v.post_id), 0) AS votes
-        FROM posts p
-        LEFT JOIN users u ON u.id = p.owner_id
-        LEFT JOIN votes v ON v.post_id = p.id
-        WHERE p.title ILIKE %s
-        GROUP BY p.id, u.id
-        LIMIT %s OFFSET %s
-    """
-    conn = database.get_connection()
-    cursor = conn.cursor()
-    cursor.execute(query, (f"%{search}%", limit, skip))
-    raw_posts = cursor.fetchall()
-    cursor.close()
+    if ids is not None:
+        posts = loaders.posts.load_many(parse_ids(ids))
+        return [format_post(post) for post in posts if post is not None]
+
+    after = decode_cursor(cursor) if cursor else None
+    # One extra row is fetched to tell whether another page exists
+    if settings.sharding_enabled:
+        rows = loaders.attach_owners(sharding.list_posts(search, limit + 1, skip, after))
+    else:
+        params = {"search": f"%{search}%", "limit": limit + 1, "skip": skip}
+        cursor_filter = ""
+        if after:
+            params["after_created_at"], params["after_id"] = after
+            cursor_filter = POSTS_CURSOR_FILTER
+
+        conn = database.get_connection()
+        try:
+            db_cursor = conn.cursor()
+            db_cursor.execute(POSTS_LISTING_QUERY.format(cursor_filter=cursor_filter), params)
+            rows = db_cursor.fetchall()
+            db_cursor.close()
+        finally:
+            database.release_connection(conn)
+
+    if len(rows) > limit:
+        rows = rows[:limit]
+        response.headers["X-Next-Cursor"] = encode_cursor(rows[-1]["created_at"], rows[-1]["id"])
 
     # Transform raw query results to the expected format
-    posts = [
-        {
-            "Post": {
-                "id": post["id"],
-                "title": post["title"],
-                "content": post["content"],
-                "published": post["published"],
-                "created_at": post["created_at"],
-                "owner_id": post["owner_id"],
-                "owner": {
-                    "id": post["owner_id"],
-                    "email": post["owner_email"],
-                    "created_at": post["owner_created_at"]
-                }
-            },
-            "votes": post["votes"]
-        }
-        for post in raw_posts
-    ]
-    return posts
+    return [format_post(post) for post in rows]
 
 
 # Create a new post
 @router.post("/", status_code=status.HTTP_201_CREATED, response_model=schemas.Post)
 def create_post(
     post: schemas.PostCreate,
-    current_user: dict = Depends(oauth2.get_current_user)
+    current_user: dict = Depends(oauth2.get_current_user),
+    loaders: Loaders = Depends(get_loaders)
 ):
     query = """
         INSERT INTO posts (title, content, owner_id)
         VALUES (%s, %s, %s) RETURNING *
     """
-    conn = database.get_connection()
-    cursor = conn.cursor()
-    cursor.execute(query, (post.title, post.content, current_user['id']))
-    new_post = cursor.fetchone()
+    conn = sharding.get_owner_connection(current_user['id'])
+    try:
+        cursor = conn.cursor()
+        if settings.sharding_enabled:
+            new_post = sharding.insert_post(cursor, current_user['id'], post.title, post.content)
+        else:
+            cursor.execute(query, (post.title, post.content, current_user['id']))
+            new_post = cursor.fetchone()
+        conn.commit()
+        cursor.close()
+    finally:
+        sharding.release_connection(conn)
 
     # Fetch owner details
-    user_query = "SELECT * FROM users WHERE id = %s"
-    cursor.execute(user_query, (new_post['owner_id'],))
-    user = cursor.fetchone()
-    new_post['owner'] = user
-
-    conn.commit()
-    cursor.close()
+    new_post['owner'] = loaders.users.load(new_post['owner_id'])
     return new_post
 
 
+# Get the current user's posts, newest first, with keyset pagination
+@router.get("/mine", response_model=schemas.PostPage)
+def get_my_posts(
+    current_user: dict = Depends(oauth2.get_current_user),
+    limit: int = Query(10, ge=1, le=100),
+    cursor: Optional[str] = None,
+    loaders: Loaders = Depends(get_loaders)
+):
+    return get_owner_posts_page(current_user["id"], limit, cursor, loaders)
+
+
 # Get a specific post by ID
 @router.get("/{id}", response_model=schemas.PostOut)
 def get_post(
     id: int,
-    current_user: int = Depends(oauth2.get_current_user)
+    current_user: int = Depends(oauth2.get_current_user),
+    loaders: Loaders = Depends(get_loaders)
 ):
-    query = """
-        SELECT p.id, p.title, p.content, p.published, p.created_at, p.owner_id,
-               u.id AS owner_id, u.email AS owner_email, u.created_at AS owner_created_at,
-               COALESCE(count(v.post_id), 0) AS votes
-        FROM posts p
-        LEFT JOIN users u ON u.id = p.owner_id
-        LEFT JOIN votes v ON v.post_id = p.id
-        WHERE p.id = %s
-        GROUP BY p.id, u.id
-    """
-    conn = database.get_connection()
-    cursor = conn.cursor()
-    cursor.execute(query, (id,))
-    post = cursor.fetchone()
-    cursor.close()
+    post = loaders.posts.load(id)
 
     if not post:
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail=f"Post with id: {id} was not found.")
 
-    post_data = {
-        "Post": {
-            "id": post["id"],
-            "title": post["title"],
-            "content": post["content"],
-            "published": post["published"],
-            "created_at": post["created_at"],
-            "owner_id": post["owner_id"],
-            "owner": {
-                "id": post["owner_id"],
-                "email": post["owner_email"],
-                "created_at": post["owner_created_at"]
-            }
-        },
-        "votes": post["votes"]
-    }
-    return post_data
+    return format_post(post)
 
 
 # Delete a post by ID
@@ -132,22 +275,28 @@ def delete_post(
     id: int,
     current_user: dict = Depends(oauth2.get_current_user)
 ):
-    conn = database.get_connection()
-    cursor = conn.cursor()
-    cursor.execute("SELECT * FROM posts WHERE id = %s", (id,))
-    post = cursor.fetchone()
+    # The post and its votes live on the node the post id routes to
+    conn = sharding.get_post_connection(id)
+    try:
+        cursor = conn.cursor()
+        cursor.execute(POST_BY_ID_QUERY, (id,))
+        post = cursor.fetchone()
 
-    if not post:
+        if not post:
+            cursor.close()
+            raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail=f"Post with id: {id} does not exist.")
+        
+        if post["owner_id"] != current_user["id"]:
+            cursor.close()
+            raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Not authorized to perform the requested action")
+        
+        # Votes are removed explicitly since partitioned votes have no foreign key to posts
+        cursor.execute(DELETE_POST_VOTES_QUERY, (id,))
+        cursor.execute(DELETE_POST_QUERY, (id,))
+        conn.commit()
         cursor.close()
-        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail=f"Post with id: {id} does not exist.")
-    
-    if post["owner_id"] != current_user["id"]:
-        cursor.close()
-        raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Not authorized to perform the requested action")
-    
-    cursor.execute("DELETE FROM posts WHERE id = %s", (id,))
-    conn.commit()
-    cursor.close()
+    finally:
+        sharding.release_connection(conn)
     return Response(status_code=status.HTTP_204_NO_CONTENT)
 
 
@@ -156,32 +305,33 @@ def delete_post(
 def update_post(
     id: int,
     updated_post: schemas.PostCreate,
-    current_user: dict = Depends(oauth2.get_current_user)
+    current_user: dict = Depends(oauth2.get_current_user),
+    loaders: Loaders = Depends(get_loaders)
 ):
-    conn = database.get_connection()
-    cursor = conn.cursor()
+    # The post lives on the node the post id routes to
+    conn = sharding.get_post_connection(id)
+    try:
+        cursor = conn.cursor()
 
-    cursor.execute("SELECT * FROM posts WHERE id = %s", (id,))
-    post = cursor.fetchone()
-    if not post:
-        cursor.close()
-        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail=f"Post with id: {id} does not exist.")
-    
-    if post["owner_id"] != current_user["id"]:
-        cursor.close()
-        raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Not authorized to perform the requested action")
-    
-    update_query = """
-        UPDATE posts SET title = %s, content = %s WHERE id = %s RETURNING id, title, content, published, created_at, owner_id
-    """
-    cursor.execute(update_query, (updated_post.title, updated_post.content, id))
-    updated_post_data = cursor.fetchone()
+        cursor.execute(POST_BY_ID_QUERY, (id,))
+        post = cursor.fetchone()
+        if not post:
+            cursor.close()
+            raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail=f"Post with id: {id} does not exist.")
+        
+        if post["owner_id"] != current_user["id"]:
+            cursor.close()
+            raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Not authorized to perform the requested action")
+        
+        cursor.execute(UPDATE_POST_QUERY, (updated_post.title, updated_post.content, id))
+        updated_post_data = cursor.fetchone()
 
-    cursor.execute("SELECT id, email, created_at FROM users WHERE id = %s", (updated_post_data["owner_id"],))
-    owner_data = cursor.fetchone()
+        conn.commit()
+        cursor.close()
+    finally:
+        sharding.release_connection(conn)
 
-    conn.commit()
-    cursor.close()
+    owner_data = loaders.users.load(updated_post_data["owner_id"])
 
     response_data = {
         "Post": {
@@ -197,6 +347,6 @@ def update_post(
                 "created_at": owner_data["created_at"]
             }
         },
-        "votes": 0  # Default votes to 0 or fetch current vote count if needed
+        "votes": loaders.vote_counts.load(id)
     }
     return response_data
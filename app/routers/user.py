@@ -1,11 +1,16 @@
-from fastapi import APIRouter, status, HTTPException, Depends
-from .. import schemas, utils, database
+from fastapi import APIRouter, status, HTTPException, Depends, Query
+from typing import List, Optional
+from .. import schemas, utils, database, oauth2
+from .post import get_owner_posts_page
+from ..loaders import Loaders, get_loaders, parse_ids
+from ..profiling import ProfiledRoute
 from psycopg2.extras import RealDictCursor
 
 # Initialize router for handling user-related API endpoints
 router = APIRouter(
     prefix="/users",   # Prefix all routes with '/users'
-    tags=['Users']     # Group documentation under "Users" category
+    tags=['Users'],    # Group documentation under "Users" category
+    route_class=ProfiledRoute  # Instrument handlers for profiling
 )
 
 # Define a route to create a new user
@@ -68,9 +73,24 @@ def create_user(user: schemas.UserCreate):
             cursor.close()
             database.release_connection(conn)
 
+# Define a route to get several users by their IDs in a single query
+@router.get("/", response_model=List[schemas.UserOut])
+def get_users(ids: str, loaders: Loaders = Depends(get_loaders)):
+    """
+    Retrieve several users by their IDs, e.g. GET /users?ids=1,2,3.
+    
+    Parameters:
+    - ids: str - Comma-separated user IDs.
+    
+    Returns:
+    - User data (id, email, created_at) for every ID that exists, in the requested order.
+    """
+    users = loaders.users.load_many(parse_ids(ids))
+    return [user for user in users if user is not None]
+
 # Define a route to get a user by their ID
 @router.get("/{id}", response_model=schemas.UserOut)
-def get_user(id: int):
+def get_user(id: int, loaders: Loaders = Depends(get_loaders)):
     """
     Retrieve a user by their ID.
     
@@ -80,38 +100,44 @@ def get_user(id: int):
     Returns:
     - User data (id, email, created_at) if found.
     """
-    conn = None
     try:
-        # Get a connection from the pool
-        conn = database.get_connection()
-        cursor = conn.cursor(cursor_factory=RealDictCursor)
-        
-        # Query the database for a user with the specified ID
-        cursor.execute("SELECT id, email, created_at FROM users WHERE id = %s", (id,))
-        user = cursor.fetchone()
-        
-        # If user does not exist, raise a 404 error
-        if not user:
-            raise HTTPException(
-                status_code=status.HTTP_404_NOT_FOUND,
-                detail=f"User with id: {id} does not exist."
-            )
-        
-        # Return the user if found
-        return user
-    
-    except HTTPException as http_exc:
-        # Propagate HTTP exceptions (e.g., 404 not found) for proper response
-        raise http_exc
+        user = loaders.users.load(id)
     except Exception as e:
         # Handle unexpected errors as 500 errors
         print(f"An unexpected error occurred: {e}")
         raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR)
-    finally:
-        # Ensure resources are properly released back to the pool
-        if conn:
-            cursor.close()
-            database.release_connection(conn)
-
 
+    # If user does not exist, raise a 404 error
+    if not user:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail=f"User with id: {id} does not exist."
+        )
+    return user
 
+# Define a route to list a user's posts, newest first, with keyset pagination
+@router.get("/{id}/posts", response_model=schemas.PostPage)
+def get_user_posts(
+    id: int,
+    current_user: dict = Depends(oauth2.get_current_user),
+    limit: int = Query(10, ge=1, le=100),
+    cursor: Optional[str] = None,
+    loaders: Loaders = Depends(get_loaders)
+):
+    """
+    Retrieve one page of a user's posts.
+    
+    Parameters:
+    - id: int - The unique identifier of the user.
+    - limit: int - Maximum number of posts to return (1-100).
+    - cursor: str - The next_cursor value from the previous page, if any.
+    
+    Returns:
+    - The posts on the page with their vote counts, and the cursor for the next page.
+    """
+    if not loaders.users.load(id):
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail=f"User with id: {id} does not exist."
+        )
+    return get_owner_posts_page(id, limit, cursor, loaders)
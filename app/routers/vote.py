@@ -1,11 +1,19 @@
 from fastapi import APIRouter, Depends, HTTPException, status
-from .. import schemas, oauth2
-from ..database import get_connection, release_connection
+from .. import schemas, oauth2, sharding
+from ..profiling import ProfiledRoute
+
+# Queries used by the vote endpoint. Every votes query filters on post_id, the hash
+# partition key, so each one touches a single votes partition when partitioning is enabled.
+POST_EXISTS_QUERY = "SELECT * FROM posts WHERE id = %s"
+FIND_VOTE_QUERY = "SELECT * FROM votes WHERE post_id = %s AND user_id = %s"
+INSERT_VOTE_QUERY = "INSERT INTO votes (post_id, user_id) VALUES (%s, %s)"
+DELETE_VOTE_QUERY = "DELETE FROM votes WHERE post_id = %s AND user_id = %s"
 
 # Create an APIRouter instance for vote-related operations
 router = APIRouter(
     prefix="/vote",
-    tags=["Vote"]
+    tags=["Vote"],
+    route_class=ProfiledRoute
 )
 
 @router.post("/", status_code=status.HTTP_201_CREATED)
@@ -23,13 +31,13 @@ def vote(
     Returns:
         dict: A message indicating the result of the voting action.
     """
-    # Acquire a database connection
-    conn = get_connection()
+    # Acquire a connection to the node holding the post and its votes
+    conn = sharding.get_post_connection(vote.post_id)
     try:
         cursor = conn.cursor()
 
         # Check if the target post exists
-        cursor.execute("SELECT * FROM posts WHERE id = %s", (vote.post_id,))
+        cursor.execute(POST_EXISTS_QUERY, (vote.post_id,))
         post = cursor.fetchone()
         if not post:
             raise HTTPException(
@@ -41,10 +49,7 @@ def vote(
         user_id = current_user["id"]
 
         # Check if the user has already voted on the post
-        cursor.execute(
-            "SELECT * FROM votes WHERE post_id = %s AND user_id = %s",
-            (vote.post_id, user_id)
-        )
+        cursor.execute(FIND_VOTE_QUERY, (vote.post_id, user_id))
         found_vote = cursor.fetchone()
 
         # Handle upvote action
@@ -56,10 +61,7 @@ def vote(
                 )
 
             # Insert new vote into the database
-            cursor.execute(
-                "INSERT INTO votes (post_id, user_id) VALUES (%s, %s)",
-                (vote.post_id, user_id)
-            )
+            cursor.execute(INSERT_VOTE_QUERY, (vote.post_id, user_id))
             conn.commit()
             return {"Message": "Successfully added vote"}
 
@@ -72,14 +74,11 @@ def vote(
                 )
 
             # Remove the vote from the database
-            cursor.execute(
-                "DELETE FROM votes WHERE post_id = %s AND user_id = %s",
-                (vote.post_id, user_id)
-            )
+            cursor.execute(DELETE_VOTE_QUERY, (vote.post_id, user_id))
             conn.commit()
             return {"Message": "Vote successfully deleted"}
     finally:
         # Ensure the connection is released back to the pool
-        release_connection(conn)
+        sharding.release_connection(conn)
 
 
@@ -1,6 +1,6 @@
 from datetime import datetime
 from pydantic import BaseModel, EmailStr, Field
-from typing import Optional, Union
+from typing import List, Optional, Union
 from typing_extensions import Annotated
 
 class PostBase(BaseModel):
@@ -35,6 +35,10 @@ class PostOut(BaseModel):
     class Config:
         from_attributes = True
 
+class PostPage(BaseModel):
+    items: List[PostOut]
+    next_cursor: Optional[str] = None
+
 class UserCreate(BaseModel):
     email: EmailStr
     password: str
@@ -46,6 +50,10 @@ class UserLogin(BaseModel):
 class Token(BaseModel):
     access_token: str
     token_type: str
+    refresh_token: Optional[str] = None
+
+class RefreshRequest(BaseModel):
+    refresh_token: str
 
 class TokenData(BaseModel):
     id: Optional[Union[str, int]] = None
@@ -0,0 +1,205 @@
+"""
+Refresh-token sessions.
+
+Expired sessions and sessions revoked more than REFRESH_TOKEN_EXPIRE_DAYS ago are removed by
+`purge`, which should run on a schedule, e.g. daily from cron:
+
+    30 3 * * * cd /app && python -m app.sessions purge
+"""
+import argparse
+import hashlib
+import hmac
+import secrets
+from datetime import datetime, timedelta, timezone
+from typing import Optional
+
+from . import database
+from .config import settings
+
+REFRESH_TOKEN_EXPIRE_DAYS = settings.refresh_token_expire_days
+
+
+def _hash_secret(secret: str) -> bytes:
+    # Refresh secrets are random 256-bit values, so a plain SHA-256 is enough; no bcrypt needed
+    return hashlib.sha256(secret.encode()).digest()
+
+
+def _split_token(token: str):
+    session_id, _, secret = token.partition(".")
+    # isdigit() alone also accepts non-ASCII digits such as "¹", which int() rejects
+    if not (session_id.isascii() and session_id.isdigit()) or not secret:
+        return None, None
+    return int(session_id), secret
+
+
+def create_refresh_token(cursor, user_id: int) -> str:
+    """
+    Starts a new session for a user and returns its refresh token.
+
+    The token has the form "<session id>.<secret>": the id locates the session row by
+    primary key and only a hash of the secret is stored.
+
+    Args:
+        cursor: Cursor of the caller's transaction; the caller commits.
+        user_id (int): Owner of the session.
+
+    Returns:
+        str: The refresh token to hand to the client.
+    """
+    secret = secrets.token_urlsafe(32)
+    expires_at = datetime.now(timezone.utc) + timedelta(days=REFRESH_TOKEN_EXPIRE_DAYS)
+    cursor.execute(
+        "INSERT INTO sessions (user_id, token_hash, expires_at) VALUES (%s, %s, %s) RETURNING id",
+        (user_id, _hash_secret(secret), expires_at)
+    )
+    session_id = cursor.fetchone()["id"]
+    return f"{session_id}.{secret}"
+
+
+def rotate_refresh_token(token: str):
+    """
+    Exchanges a refresh token for a new one.
+
+    On success the session's secret is replaced in a single UPDATE by primary key, so the
+    old token stops working. Presenting the token that was just rotated out means it has
+    been used twice (e.g. it was stolen), and the whole session is revoked.
+
+    Args:
+        token (str): The refresh token presented by the client.
+
+    Returns:
+        tuple: (user_id, new refresh token), or (None, None) if the token is invalid,
+        expired, revoked or reused.
+    """
+    session_id, secret = _split_token(token)
+    if session_id is None:
+        return None, None
+
+    presented_hash = _hash_secret(secret)
+    new_secret = secrets.token_urlsafe(32)
+    conn = database.get_connection()
+    try:
+        cursor = conn.cursor()
+        cursor.execute(
+            """
+            UPDATE sessions
+            SET previous_hash = token_hash, token_hash = %s, last_used_at = NOW()
+            WHERE id = %s AND token_hash = %s AND revoked_at IS NULL AND expires_at > NOW()
+            RETURNING user_id
+            """,
+            (_hash_secret(new_secret), session_id, presented_hash)
+        )
+        session = cursor.fetchone()
+
+        if session is None:
+            # Only the failure path looks at the session again, to detect reuse
+            cursor.execute("SELECT previous_hash FROM sessions WHERE id = %s", (session_id,))
+            row = cursor.fetchone()
+            previous_hash = bytes(row["previous_hash"]) if row and row["previous_hash"] else None
+            if previous_hash and hmac.compare_digest(previous_hash, presented_hash):
+                cursor.execute(
+                    "UPDATE sessions SET revoked_at = NOW() WHERE id = %s AND revoked_at IS NULL",
+                    (session_id,)
+                )
+            conn.commit()
+            cursor.close()
+            return None, None
+
+        conn.commit()
+        cursor.close()
+        return session["user_id"], f"{session_id}.{new_secret}"
+    except Exception:
+        conn.rollback()
+        raise
+    finally:
+        database.release_connection(conn)
+
+
+def revoke_refresh_token(token: str, user_id: Optional[int] = None) -> bool:
+    """
+    Revokes the session a refresh token belongs to.
+
+    Args:
+        token (str): The refresh token to revoke.
+        user_id (Optional[int]): If given, only revoke the session when it belongs to this user.
+
+    Returns:
+        bool: True if a session was revoked.
+    """
+    session_id, secret = _split_token(token)
+    if session_id is None:
+        return False
+
+    query = "UPDATE sessions SET revoked_at = NOW() WHERE id = %s AND token_hash = %s AND revoked_at IS NULL"
+    params = [session_id, _hash_secret(secret)]
+    if user_id is not None:
+        query += " AND user_id = %s"
+        params.append(user_id)
+
+    conn = database.get_connection()
+    try:
+        cursor = conn.cursor()
+        cursor.execute(query, params)
+        revoked = cursor.rowcount > 0
+        conn.commit()
+        cursor.close()
+        return revoked
+    finally:
+        database.release_connection(conn)
+
+
+def revoke_user_sessions(user_id: int) -> int:
+    """
+    Revokes every active session of a user (e.g. "log out everywhere" or a password change).
+
+    Returns:
+        int: Number of sessions revoked.
+    """
+    conn = database.get_connection()
+    try:
+        cursor = conn.cursor()
+        cursor.execute(
+            "UPDATE sessions SET revoked_at = NOW() WHERE user_id = %s AND revoked_at IS NULL",
+            (user_id,)
+        )
+        revoked = cursor.rowcount
+        conn.commit()
+        cursor.close()
+        return revoked
+    finally:
+        database.release_connection(conn)
+
+
+def purge_sessions() -> int:
+    """
+    Deletes expired sessions and sessions revoked more than REFRESH_TOKEN_EXPIRE_DAYS ago.
+
+    Revoked sessions are kept for a while so reuse of their tokens can still be recognised.
+
+    Returns:
+        int: Number of sessions deleted.
+    """
+    conn = database.get_connection()
+    try:
+        cursor = conn.cursor()
+        cursor.execute(
+            "DELETE FROM sessions WHERE expires_at < NOW() OR revoked_at < NOW() - %s * INTERVAL '1 day'",
+            (REFRESH_TOKEN_EXPIRE_DAYS,)
+        )
+        deleted = cursor.rowcount
+        conn.commit()
+        cursor.close()
+        return deleted
+    finally:
+        database.release_connection(conn)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Maintain refresh-token sessions.")
+    parser.add_argument("command", choices=["purge"])
+    parser.parse_args()
+    print(f"purged {purge_sessions()} sessions")
+
+
+if __name__ == "__main__":
+    main()
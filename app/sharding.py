@@ -0,0 +1,526 @@
+"""
+Owner-based horizontal sharding of posts and votes (settings.sharding_enabled).
+
+Users stay in the primary database (app/database.py). Posts and their votes live on one
+of several Postgres nodes, chosen by bucket: bucket = owner_id % buckets. The shard map
+JSON file (settings.shard_map_path) lists the nodes and which node owns each bucket:
+
+    {
+        "buckets": 64,
+        "nodes": {"shard0": "postgresql://postgres:pw@localhost:5433/fastapi",
+                  "shard1": "postgresql://postgres:pw@localhost:5434/fastapi"},
+        "routing": ["shard0", "shard1", "shard0", ...],  # one node name per bucket
+        "moving": []                                     # buckets being moved, read-only
+    }
+
+Post ids encode their bucket (post_id % buckets == owner_id % buckets), so a post and its
+votes can be located from the post id alone. Nodes must only ever be appended to "nodes":
+a node's position seeds its id sequence, which keeps ids unique across nodes.
+
+Usage:
+    python -m app.sharding init                       # create the shard tables on every node
+    python -m app.sharding status                     # posts per bucket and node
+    python -m app.sharding move --bucket 5 --to shard1
+"""
+import argparse
+import heapq
+import json
+import os
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List, Optional
+
+from fastapi import HTTPException, status as http_status
+from psycopg2 import pool
+from psycopg2.extras import RealDictCursor, execute_values
+
+from . import database
+from .config import settings
+
+# Upper bound on the number of nodes; node sequences are interleaved by this step
+MAX_SHARDS = 16
+
+# Workers check the shard map file for changes at most this often
+MAP_RELOAD_SECONDS = 1
+
+# Schema of the posts and votes tables on shard nodes. Users live on the primary, so there
+# are no foreign keys to users; ids are BIGINT since they carry the bucket.
+SHARD_TABLES = {
+    "posts": """
+        CREATE TABLE IF NOT EXISTS posts (
+            id BIGINT PRIMARY KEY,
+            title VARCHAR(255) NOT NULL,
+            content TEXT NOT NULL,
+            published BOOLEAN NOT NULL DEFAULT TRUE,
+            created_at TIMESTAMPTZ NOT NULL DEFAULT NOW(),
+            owner_id INTEGER NOT NULL
+        )
+    """,
+    "votes": """
+        CREATE TABLE IF NOT EXISTS votes (
+            user_id INTEGER NOT NULL,
+            post_id BIGINT NOT NULL,
+            PRIMARY KEY (user_id, post_id),
+            FOREIGN KEY (post_id) REFERENCES posts (id) ON DELETE CASCADE
+        )
+    """,
+}
+
+SHARD_INDEXES = {
+    "posts_owner_created_at_idx": """
+        CREATE INDEX IF NOT EXISTS posts_owner_created_at_idx
+        ON posts (owner_id, created_at DESC, id DESC)
+    """,
+    "posts_created_at_idx": """
+        CREATE INDEX IF NOT EXISTS posts_created_at_idx ON posts (created_at DESC, id DESC)
+    """,
+    "votes_post_id_idx": """
+        CREATE INDEX IF NOT EXISTS votes_post_id_idx ON votes (post_id)
+    """,
+}
+
+# Post columns plus vote count, without the owner (which lives on the primary)
+SHARD_POSTS_SELECT = """
+    SELECT p.id, p.title, p.content, p.published, p.created_at, p.owner_id,
+           (SELECT count(*) FROM votes v WHERE v.post_id = p.id) AS votes
+    FROM posts p
+"""
+SHARD_LISTING_QUERY = SHARD_POSTS_SELECT + """
+    WHERE p.title ILIKE %(search)s {cursor_filter}
+    ORDER BY p.created_at DESC, p.id DESC
+    LIMIT %(limit)s
+"""
+SHARD_OWNER_QUERY = SHARD_POSTS_SELECT + """
+    WHERE p.owner_id = %(owner_id)s {cursor_filter}
+    ORDER BY p.created_at DESC, p.id DESC
+    LIMIT %(limit)s
+"""
+SHARD_CURSOR_FILTER = """
+    AND p.created_at <= %(after_created_at)s
+    AND (p.created_at, p.id) < (%(after_created_at)s, %(after_id)s)
+"""
+SHARD_INSERT_POST_QUERY = """
+    INSERT INTO posts (id, title, content, owner_id)
+    VALUES (nextval('post_id_seq') * %s + %s, %s, %s, %s) RETURNING *
+"""
+
+
+class ShardMap:
+    """
+    Bucket to node routing, loaded from the shard map JSON file.
+    """
+
+    def __init__(self, buckets: int, nodes: Dict[str, str], routing: List[str], moving: Optional[List[int]] = None):
+        if len(routing) != buckets:
+            raise ValueError(f"Shard map routes {len(routing)} buckets, expected {buckets}")
+        unknown = set(routing) - set(nodes)
+        if unknown:
+            raise ValueError(f"Shard map routes buckets to unknown nodes: {sorted(unknown)}")
+        if len(nodes) > MAX_SHARDS:
+            raise ValueError(f"At most {MAX_SHARDS} shard nodes are supported")
+        self.buckets = buckets
+        self.nodes = nodes
+        self.routing = routing
+        self.moving = sorted(set(moving or []))
+
+    @classmethod
+    def load(cls, path: str) -> "ShardMap":
+        with open(path) as f:
+            data = json.load(f)
+        return cls(data["buckets"], data["nodes"], data["routing"], data.get("moving"))
+
+    def save(self, path: str):
+        # Write to a temporary file and rename it so readers never see a partial map
+        data = {"buckets": self.buckets, "nodes": self.nodes, "routing": self.routing, "moving": self.moving}
+        directory = os.path.dirname(os.path.abspath(path))
+        with tempfile.NamedTemporaryFile("w", dir=directory, delete=False, suffix=".tmp") as f:
+            json.dump(data, f, indent=2)
+        os.replace(f.name, path)
+
+    def node_index(self, node: str) -> int:
+        return list(self.nodes).index(node)
+
+    def bucket_for_owner(self, owner_id: int) -> int:
+        return owner_id % self.buckets
+
+    def bucket_for_post(self, post_id: int) -> int:
+        return post_id % self.buckets
+
+    def node_for_owner(self, owner_id: int) -> str:
+        return self.routing[self.bucket_for_owner(owner_id)]
+
+    def node_for_post(self, post_id: int) -> str:
+        return self.routing[self.bucket_for_post(post_id)]
+
+    def is_moving(self, bucket: int) -> bool:
+        return bucket in self.moving
+
+
+_map_lock = threading.Lock()
+_map: Optional[ShardMap] = None
+_map_mtime = 0.0
+_map_checked_at = 0.0
+
+
+def shard_map() -> ShardMap:
+    """
+    Returns the current shard map, reloading the file at most every MAP_RELOAD_SECONDS if it changed.
+
+    This lets running workers pick up the routing changes made by `move`.
+    """
+    global _map, _map_mtime, _map_checked_at
+    now = time.monotonic()
+    if _map is not None and now - _map_checked_at < MAP_RELOAD_SECONDS:
+        return _map
+    with _map_lock:
+        _map_checked_at = now
+        mtime = os.path.getmtime(settings.shard_map_path)
+        if _map is None or mtime != _map_mtime:
+            _map = ShardMap.load(settings.shard_map_path)
+            _map_mtime = mtime
+        return _map
+
+
+# One connection pool per node, created on first use
+_pools: Dict[str, pool.SimpleConnectionPool] = {}
+_pools_lock = threading.Lock()
+# id(connection) -> node name, so connections go back to the pool they came from
+_checked_out: Dict[int, str] = {}
+
+
+def get_node_connection(node: str):
+    """
+    Returns a connection from the pool of a shard node.
+    """
+    with _pools_lock:
+        if node not in _pools:
+            _pools[node] = pool.SimpleConnectionPool(
+                1, 10, dsn=shard_map().nodes[node], cursor_factory=RealDictCursor
+            )
+        conn = _pools[node].getconn()
+        _checked_out[id(conn)] = node
+        return conn
+
+
+def _check_writable(shards: ShardMap, bucket: int):
+    if shards.is_moving(bucket):
+        raise HTTPException(
+            status_code=http_status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail="These posts are being moved, try again shortly",
+            headers={"Retry-After": str(MAP_RELOAD_SECONDS * 5)}
+        )
+
+
+def get_owner_connection(owner_id: int):
+    """
+    Returns a connection for writing an owner's posts, or the primary when sharding is off.
+
+    Raises:
+        HTTPException: 503 while the owner's bucket is being moved.
+    """
+    if not settings.sharding_enabled:
+        return database.get_connection()
+    shards = shard_map()
+    _check_writable(shards, shards.bucket_for_owner(owner_id))
+    return get_node_connection(shards.node_for_owner(owner_id))
+
+
+def get_post_connection(post_id: int):
+    """
+    Returns a connection for writing a post and its votes, or the primary when sharding is off.
+
+    Raises:
+        HTTPException: 503 while the post's bucket is being moved.
+    """
+    if not settings.sharding_enabled:
+        return database.get_connection()
+    shards = shard_map()
+    _check_writable(shards, shards.bucket_for_post(post_id))
+    return get_node_connection(shards.node_for_post(post_id))
+
+
+def release_connection(conn):
+    """
+    Releases a connection obtained from this module back to its pool.
+    """
+    with _pools_lock:
+        node = _checked_out.pop(id(conn), None)
+        if node is not None:
+            _pools[node].putconn(conn)
+            return
+    database.release_connection(conn)
+
+
+def insert_post(cursor, owner_id: int, title: str, content: str):
+    """
+    Inserts a post on the owner's node with an id that encodes the owner's bucket.
+    """
+    shards = shard_map()
+    cursor.execute(
+        SHARD_INSERT_POST_QUERY,
+        (shards.buckets, shards.bucket_for_owner(owner_id), title, content, owner_id)
+    )
+    return cursor.fetchone()
+
+
+def _query_node(node: str, query: str, params) -> list:
+    conn = get_node_connection(node)
+    try:
+        cursor = conn.cursor()
+        cursor.execute(query, params)
+        rows = cursor.fetchall()
+        cursor.close()
+        conn.commit()
+        return rows
+    finally:
+        release_connection(conn)
+
+
+def scatter(query: str, params_by_node: Dict[str, object]) -> Dict[str, list]:
+    """
+    Runs a query on several nodes in parallel.
+
+    Args:
+        query (str): SQL to run on every node.
+        params_by_node (dict): Node name -> query parameters.
+
+    Returns:
+        dict: Node name -> fetched rows.
+    """
+    if len(params_by_node) == 1:
+        node, params = next(iter(params_by_node.items()))
+        return {node: _query_node(node, query, params)}
+    with ThreadPoolExecutor(max_workers=len(params_by_node)) as executor:
+        futures = {node: executor.submit(_query_node, node, query, params) for node, params in params_by_node.items()}
+        return {node: future.result() for node, future in futures.items()}
+
+
+def merge_pages(pages: List[list], limit: int) -> list:
+    """
+    Merges per-node pages sorted by (created_at, id) descending into the first `limit` rows.
+    """
+    merged = heapq.merge(*pages, key=lambda row: (row["created_at"], row["id"]), reverse=True)
+    return [row for _, row in zip(range(limit), merged)]
+
+
+def list_posts(search: str, limit: int, skip: int = 0, after: Optional[tuple] = None) -> list:
+    """
+    Scatter-gathers the newest posts across all nodes.
+
+    Every node returns its own first skip + limit rows after the cursor position, and the
+    sorted pages are merged. Cursors (`after`) keep skip at 0 and the pages small.
+
+    Args:
+        search (str): Title search string.
+        limit (int): Number of rows wanted.
+        skip (int): Rows to skip after the cursor position.
+        after (Optional[tuple]): (created_at, id) of the last row of the previous page.
+
+    Returns:
+        list: Up to `limit` post rows with vote counts, newest first.
+    """
+    params = {"search": f"%{search}%", "limit": skip + limit}
+    cursor_filter = ""
+    if after is not None:
+        params["after_created_at"], params["after_id"] = after
+        cursor_filter = SHARD_CURSOR_FILTER
+    nodes = sorted(set(shard_map().routing))
+    pages = scatter(SHARD_LISTING_QUERY.format(cursor_filter=cursor_filter), {node: params for node in nodes})
+    return merge_pages(list(pages.values()), skip + limit)[skip:]
+
+
+def list_owner_posts(owner_id: int, limit: int, after: Optional[tuple] = None) -> list:
+    """
+    Fetches one page of an owner's posts from the owner's node.
+    """
+    params = {"owner_id": owner_id, "limit": limit}
+    cursor_filter = ""
+    if after is not None:
+        params["after_created_at"], params["after_id"] = after
+        cursor_filter = SHARD_CURSOR_FILTER
+    node = shard_map().node_for_owner(owner_id)
+    return _query_node(node, SHARD_OWNER_QUERY.format(cursor_filter=cursor_filter), params)
+
+
+def get_posts_by_id(post_ids: list) -> Dict[int, dict]:
+    """
+    Fetches posts with vote counts by id, querying each node holding some of them once.
+    """
+    shards = shard_map()
+    ids_by_node: Dict[str, list] = {}
+    for post_id in post_ids:
+        ids_by_node.setdefault(shards.node_for_post(post_id), []).append(post_id)
+    pages = scatter(SHARD_POSTS_SELECT + " WHERE p.id = ANY(%s)", {node: (ids,) for node, ids in ids_by_node.items()})
+    return {row["id"]: row for rows in pages.values() for row in rows}
+
+
+def get_vote_counts(post_ids: list) -> Dict[int, int]:
+    """
+    Counts votes per post, querying each node holding some of the posts once.
+    """
+    shards = shard_map()
+    ids_by_node: Dict[str, list] = {}
+    for post_id in post_ids:
+        ids_by_node.setdefault(shards.node_for_post(post_id), []).append(post_id)
+    pages = scatter(
+        "SELECT post_id, count(*) AS votes FROM votes WHERE post_id = ANY(%s) GROUP BY post_id",
+        {node: (ids,) for node, ids in ids_by_node.items()}
+    )
+    return {row["post_id"]: row["votes"] for rows in pages.values() for row in rows}
+
+
+def create_shard_tables(node: Optional[str] = None):
+    """
+    Creates the posts and votes tables, indexes and id sequence on every node (or one node).
+    """
+    shards = shard_map()
+    for name in [node] if node else list(shards.nodes):
+        conn = get_node_connection(name)
+        try:
+            cursor = conn.cursor()
+            # Interleaved sequences keep ids unique across nodes, even after buckets move
+            cursor.execute(
+                f"CREATE SEQUENCE IF NOT EXISTS post_id_seq AS BIGINT "
+                f"START WITH {shards.node_index(name) + 1} INCREMENT BY {MAX_SHARDS}"
+            )
+            for statement in list(SHARD_TABLES.values()) + list(SHARD_INDEXES.values()):
+                cursor.execute(statement)
+            conn.commit()
+            cursor.close()
+        finally:
+            release_connection(conn)
+
+
+def _copy_bucket(shards: ShardMap, bucket: int, source: str, target: str, batch_size: int) -> dict:
+    src = get_node_connection(source)
+    dst = get_node_connection(target)
+    copied = {"posts": 0, "votes": 0}
+    try:
+        write = dst.cursor()
+        # The target does not own the bucket, so anything there is left over from an aborted move
+        write.execute("DELETE FROM posts WHERE owner_id %% %s = %s", (shards.buckets, bucket))
+        # Named cursor streams the rows instead of loading the whole bucket in memory
+        for table, query, columns in (
+            ("posts", "SELECT * FROM posts WHERE owner_id %% %s = %s ORDER BY id",
+             "id, title, content, published, created_at, owner_id"),
+            ("votes", "SELECT v.* FROM votes v WHERE v.post_id %% %s = %s",
+             "user_id, post_id"),
+        ):
+            read = src.cursor(name=f"move_{table}")
+            read.execute(query, (shards.buckets, bucket))
+            names = [name.strip() for name in columns.split(",")]
+            while True:
+                rows = read.fetchmany(batch_size)
+                if not rows:
+                    break
+                execute_values(
+                    write,
+                    f"INSERT INTO {table} ({columns}) VALUES %s",
+                    [tuple(row[name] for name in names) for row in rows],
+                    page_size=batch_size
+                )
+                copied[table] += len(rows)
+            read.close()
+        write.close()
+        dst.commit()
+        src.commit()
+        return copied
+    except Exception:
+        dst.rollback()
+        src.rollback()
+        raise
+    finally:
+        release_connection(src)
+        release_connection(dst)
+
+
+def move_bucket(bucket: int, target: str, batch_size: int = 1000, drain_seconds: float = MAP_RELOAD_SECONDS * 3) -> dict:
+    """
+    Moves the posts and votes of one bucket to another node and reroutes the bucket.
+
+    Steps:
+    1. Mark the bucket as moving in the shard map. Writes to a moving bucket are rejected
+       with 503 (see `get_owner_connection`), reads keep going to the source.
+    2. Wait `drain_seconds` for every worker to reload the map and for in-flight writes to finish.
+    3. Copy the bucket's rows to the target. Nothing writes to the bucket, so one pass is exact.
+    4. Route the bucket to the target and clear the moving mark in one map update.
+    5. Wait again so no worker still reads the bucket from the source, then delete it there.
+
+    If copying fails, the bucket stays on the source and becomes writable again.
+
+    Returns:
+        dict: Source and target nodes and the number of posts and votes moved.
+    """
+    shards = shard_map()
+    source = shards.routing[bucket]
+    if target not in shards.nodes:
+        raise ValueError(f"Unknown node: {target}")
+    if source == target:
+        return {"bucket": bucket, "source": source, "target": target, "posts": 0, "votes": 0}
+
+    shards = ShardMap.load(settings.shard_map_path)
+    shards.moving = sorted(set(shards.moving) | {bucket})
+    shards.save(settings.shard_map_path)
+    try:
+        time.sleep(drain_seconds)
+        moved = _copy_bucket(shards, bucket, source, target, batch_size)
+    except BaseException:
+        shards.moving.remove(bucket)
+        shards.save(settings.shard_map_path)
+        raise
+
+    shards.routing[bucket] = target
+    shards.moving.remove(bucket)
+    shards.save(settings.shard_map_path)
+    time.sleep(drain_seconds)
+
+    conn = get_node_connection(source)
+    try:
+        cursor = conn.cursor()
+        # Votes go with their posts through ON DELETE CASCADE
+        cursor.execute("DELETE FROM posts WHERE owner_id %% %s = %s", (shards.buckets, bucket))
+        conn.commit()
+        cursor.close()
+    finally:
+        release_connection(conn)
+
+    return {"bucket": bucket, "source": source, "target": target, **moved}
+
+
+def status() -> Dict[str, Dict[int, int]]:
+    """
+    Returns the number of posts per bucket on every node.
+    """
+    shards = shard_map()
+    pages = scatter(
+        "SELECT owner_id %% %s AS bucket, count(*) AS posts FROM posts GROUP BY 1 ORDER BY 1",
+        {node: (shards.buckets,) for node in shards.nodes}
+    )
+    return {node: {row["bucket"]: row["posts"] for row in rows} for node, rows in pages.items()}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Manage post shards.")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    init = subparsers.add_parser("init", help="create the shard tables on every node")
+    init.add_argument("--node")
+    subparsers.add_parser("status", help="show posts per bucket and node")
+    move = subparsers.add_parser("move", help="move a bucket to another node")
+    move.add_argument("--bucket", type=int, required=True)
+    move.add_argument("--to", required=True)
+    move.add_argument("--batch-size", type=int, default=1000)
+    move.add_argument("--drain-seconds", type=float, default=MAP_RELOAD_SECONDS * 3)
+    args = parser.parse_args()
+
+    if args.command == "init":
+        create_shard_tables(args.node)
+    elif args.command == "status":
+        print(json.dumps(status(), indent=2))
+    else:
+        print(move_bucket(args.bucket, args.to, args.batch_size, args.drain_seconds))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,139 @@
+"""
+Login vs. refresh load test.
+
+Drives a running server with a steady population of concurrent clients keeping themselves
+authenticated, while other clients keep reading GET /posts:
+
+- login mode: every renewal is a password login (bcrypt verify + JWT);
+- refresh mode: every renewal is a POST /token/refresh (SHA-256 + JWT).
+
+Each mode runs for --duration seconds. Renewal throughput and latency are reported together
+with the latency of the background reads, which shows how much the renewals slow down normal
+traffic. With --server-pid (a server on the same Linux host), the server CPU time per request
+is reported too.
+
+Usage:
+    uvicorn app.main:app --workers 1 &
+    python -m benchmarks.bench_auth --url http://localhost:8000 --clients 20 --readers 20 --duration 30
+"""
+import argparse
+import os
+import threading
+import time
+from typing import Dict, List, Optional
+
+import httpx
+
+EMAIL = "bench-auth@example.com"
+PASSWORD = "bench-auth-password"
+
+
+def server_cpu_seconds(pid: Optional[int]) -> Optional[float]:
+    if pid is None:
+        return None
+    with open(f"/proc/{pid}/stat") as f:
+        fields = f.read().rsplit(")", 1)[1].split()
+    # utime and stime, in clock ticks
+    return (int(fields[11]) + int(fields[12])) / os.sysconf("SC_CLK_TCK")
+
+
+def percentile(latencies: List[float], fraction: float) -> float:
+    if not latencies:
+        return 0.0
+    ordered = sorted(latencies)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * fraction))]
+
+
+def login(client: httpx.Client) -> dict:
+    res = client.post("/login", data={"username": EMAIL, "password": PASSWORD})
+    res.raise_for_status()
+    return res.json()
+
+
+def run(url: str, mode: str, clients: int, readers: int, duration: float, server_pid: Optional[int]) -> Dict[str, list]:
+    results: Dict[str, list] = {"renewals": [], "reads": [], "errors": []}
+    lock = threading.Lock()
+    stop = threading.Event()
+
+    def renew_loop():
+        with httpx.Client(base_url=url) as client:
+            refresh_token = login(client)["refresh_token"]
+            while not stop.is_set():
+                start = time.perf_counter()
+                if mode == "login":
+                    res = client.post("/login", data={"username": EMAIL, "password": PASSWORD})
+                else:
+                    res = client.post("/token/refresh", json={"refresh_token": refresh_token})
+                elapsed = time.perf_counter() - start
+                with lock:
+                    results["renewals" if res.status_code == 200 else "errors"].append(elapsed)
+                if res.status_code == 200:
+                    refresh_token = res.json()["refresh_token"]
+                else:
+                    refresh_token = login(client)["refresh_token"]
+
+    def read_loop():
+        with httpx.Client(base_url=url) as client:
+            headers = {"Authorization": f"Bearer {login(client)['access_token']}"}
+            while not stop.is_set():
+                start = time.perf_counter()
+                res = client.get("/posts/", params={"limit": 10}, headers=headers)
+                elapsed = time.perf_counter() - start
+                with lock:
+                    results["reads" if res.status_code == 200 else "errors"].append(elapsed)
+
+    threads = [threading.Thread(target=renew_loop) for _ in range(clients)]
+    threads += [threading.Thread(target=read_loop) for _ in range(readers)]
+    for thread in threads:
+        thread.start()
+    # Let every client log in before measuring
+    time.sleep(min(5.0, duration / 5))
+    with lock:
+        for values in results.values():
+            values.clear()
+    cpu_before = server_cpu_seconds(server_pid)
+    start = time.perf_counter()
+    time.sleep(duration)
+    stop.set()
+    elapsed = time.perf_counter() - start
+    cpu_after = server_cpu_seconds(server_pid)
+    for thread in threads:
+        thread.join()
+
+    renewals, reads = results["renewals"], results["reads"]
+    print(f"{mode}: {clients} renewing clients, {readers} readers, {elapsed:.1f} s")
+    print(f"  renewals: {len(renewals) / elapsed:8.1f}/s  p50 {percentile(renewals, 0.5) * 1000:7.1f} ms"
+          f"  p99 {percentile(renewals, 0.99) * 1000:7.1f} ms")
+    print(f"  reads:    {len(reads) / elapsed:8.1f}/s  p50 {percentile(reads, 0.5) * 1000:7.1f} ms"
+          f"  p99 {percentile(reads, 0.99) * 1000:7.1f} ms")
+    if results["errors"]:
+        print(f"  errors:   {len(results['errors'])}")
+    if cpu_before is not None and renewals:
+        cpu = cpu_after - cpu_before
+        print(f"  server CPU: {cpu:.1f} s, {cpu / (len(renewals) + len(reads)) * 1000:.2f} ms per request overall")
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--url", default="http://localhost:8000")
+    parser.add_argument("--clients", type=int, default=20, help="clients renewing their tokens")
+    parser.add_argument("--readers", type=int, default=20, help="clients reading GET /posts meanwhile")
+    parser.add_argument("--duration", type=float, default=30.0, help="seconds measured per mode")
+    parser.add_argument("--mode", choices=["login", "refresh", "both"], default="both")
+    parser.add_argument("--server-pid", type=int, help="pid of the server process, to measure its CPU")
+    args = parser.parse_args()
+
+    with httpx.Client(base_url=args.url) as client:
+        # 409 means the user is left over from a previous run
+        res = client.post("/users/", json={"email": EMAIL, "password": PASSWORD})
+        if res.status_code not in (201, 409):
+            res.raise_for_status()
+
+    modes = ["login", "refresh"] if args.mode == "both" else [args.mode]
+    for mode in modes:
+        run(args.url, mode, args.clients, args.readers, args.duration, args.server_pid)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,66 @@
+"""
+Compression benchmark for post listings.
+
+Builds GET /posts-shaped payloads of increasing size and reports, for every available
+encoding, the bytes saved against the CPU time spent compressing.
+
+Usage:
+    python -m benchmarks.bench_compression
+"""
+import json
+import random
+import string
+import time
+from datetime import datetime, timezone
+
+from app.compression import DEFAULT_LEVELS, ENCODERS
+
+WORDS = ["".join(random.choices(string.ascii_lowercase, k=random.randint(3, 10))) for _ in range(2000)]
+
+
+def make_listing(count: int) -> bytes:
+    """Builds a JSON body shaped like the response of GET /posts?limit=<count>."""
+    now = datetime.now(timezone.utc).isoformat()
+    posts = [
+        {
+            "Post": {
+                "id": i,
+                "title": " ".join(random.choices(WORDS, k=6)),
+                "content": " ".join(random.choices(WORDS, k=300)),
+                "published": True,
+                "created_at": now,
+                "owner_id": i % 50,
+                "owner": {"id": i % 50, "email": f"user{i % 50}@example.com", "created_at": now},
+            },
+            "votes": random.randint(0, 500),
+        }
+        for i in range(count)
+    ]
+    return json.dumps(posts).encode()
+
+
+def bench(body: bytes, encoding: str, rounds: int = 20):
+    compress = ENCODERS[encoding]
+    level = DEFAULT_LEVELS[encoding]
+    start = time.process_time()
+    for _ in range(rounds):
+        compressed = compress(body, level)
+    cpu_ms = (time.process_time() - start) / rounds * 1000
+    return len(compressed), cpu_ms
+
+
+def main():
+    print(f"{'posts':>6} {'encoding':>8} {'raw KB':>9} {'out KB':>9} {'saved %':>8} {'cpu ms':>8} {'KB saved/cpu ms':>16}")
+    for count in (10, 100, 1000):
+        body = make_listing(count)
+        for encoding in ENCODERS:
+            size, cpu_ms = bench(body, encoding)
+            saved = len(body) - size
+            print(
+                f"{count:>6} {encoding:>8} {len(body) / 1024:>9.1f} {size / 1024:>9.1f} "
+                f"{saved / len(body) * 100:>8.1f} {cpu_ms:>8.2f} {saved / 1024 / max(cpu_ms, 1e-6):>16.1f}"
+            )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,101 @@
+"""
+Per-owner listing benchmark.
+
+Grows a posts table in a scratch schema and checks, at every size, that the keyset
+page for one owner is read with an Index Only Scan on posts_owner_created_at_idx.
+Reports execution time and heap fetches for the first page and a deep page.
+
+Runs against the database configured in .env; everything happens in the
+`bench_owner_posts` schema, which is dropped at the end.
+
+Usage:
+    python -m benchmarks.bench_owner_posts
+"""
+import json
+
+from app import database
+from app.models import INDEXES, TABLES
+from app.routers.post import owner_posts_query
+
+SCHEMA = "bench_owner_posts"
+OWNERS = 100
+SIZES = (10_000, 100_000, 1_000_000)
+PAGE_SIZE = 20
+
+
+def find_nodes(plan: dict, node_type: str):
+    if plan.get("Node Type") == node_type:
+        yield plan
+    for child in plan.get("Plans", []):
+        yield from find_nodes(child, node_type)
+
+
+def explain(cursor, query: str, params: dict) -> dict:
+    cursor.execute("EXPLAIN (ANALYZE, BUFFERS, FORMAT JSON) " + query, params)
+    row = cursor.fetchone()
+    plan = row["QUERY PLAN"]
+    return (json.loads(plan) if isinstance(plan, str) else plan)[0]
+
+
+def main():
+    conn = database.get_connection()
+    conn.autocommit = True  # VACUUM cannot run inside a transaction
+    cursor = conn.cursor()
+    try:
+        cursor.execute(f"DROP SCHEMA IF EXISTS {SCHEMA} CASCADE")
+        cursor.execute(f"CREATE SCHEMA {SCHEMA}")
+        cursor.execute(f"SET search_path TO {SCHEMA}")
+        for statement in list(TABLES.values()) + list(INDEXES.values()):
+            cursor.execute(statement)
+        cursor.execute(
+            "INSERT INTO users (email, password) SELECT 'owner' || i || '@example.com', 'x' FROM generate_series(1, %s) i",
+            (OWNERS,),
+        )
+
+        print(f"{'rows':>9} {'page':>6} {'scan':>16} {'heap fetches':>13} {'ms':>8}")
+        inserted = 0
+        for size in SIZES:
+            cursor.execute(
+                """
+                INSERT INTO posts (title, content, owner_id, created_at)
+                SELECT 'title ' || i, repeat('content ', 50), 1 + i %% %s, now() - i * interval '1 second'
+                FROM generate_series(%s, %s) i
+                """,
+                (OWNERS, inserted + 1, size),
+            )
+            inserted = size
+            cursor.execute("VACUUM ANALYZE posts")
+
+            # Position of a deep page: the last page of owner 1's posts, which hold size / OWNERS rows
+            cursor.execute(
+                "SELECT created_at, id FROM posts WHERE owner_id = 1 ORDER BY created_at DESC, id DESC OFFSET %s LIMIT 1",
+                (size // OWNERS - PAGE_SIZE - 1,),
+            )
+            deep = cursor.fetchone()
+
+            pages = {
+                "first": (owner_posts_query(False), {"owner_id": 1, "limit": PAGE_SIZE}),
+                "deep": (
+                    owner_posts_query(True),
+                    {"owner_id": 1, "limit": PAGE_SIZE, "after_created_at": deep["created_at"], "after_id": deep["id"]},
+                ),
+            }
+            for name, (query, params) in pages.items():
+                result = explain(cursor, query, params)
+                scans = [
+                    node for node in find_nodes(result["Plan"], "Index Only Scan")
+                    if node.get("Index Name") == "posts_owner_created_at_idx"
+                ]
+                scan = "index-only" if scans else "NOT index-only"
+                heap_fetches = sum(node.get("Heap Fetches", 0) for node in scans)
+                print(f"{size:>9} {name:>6} {scan:>16} {heap_fetches:>13} {result['Execution Time']:>8.2f}")
+    finally:
+        cursor.execute(f"DROP SCHEMA IF EXISTS {SCHEMA} CASCADE")
+        cursor.execute("RESET search_path")
+        cursor.close()
+        conn.autocommit = False
+        database.release_connection(conn)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,120 @@
+import json
+
+import brotli
+import zstandard
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+from app.compression import (
+    CompressionMiddleware, CompressionPolicy, CompressionStats, PrecompressedCache, negotiate_encoding
+)
+
+LARGE = {"content": "lorem ipsum " * 500}
+STATS = CompressionStats()
+
+app = FastAPI()
+app.add_middleware(
+    CompressionMiddleware,
+    minimum_size=100,
+    stats=STATS,
+    route_policies={
+        "/cached": CompressionPolicy(cache=True, exact=True),
+        "/secret": CompressionPolicy(enabled=False),
+    },
+)
+
+
+@app.get("/large")
+def large():
+    return LARGE
+
+
+@app.get("/small")
+def small():
+    return {"ok": True}
+
+
+@app.get("/cached")
+def cached():
+    return LARGE
+
+
+@app.get("/cached/mine")
+def cached_mine():
+    return LARGE
+
+
+@app.get("/secret")
+def secret():
+    return LARGE
+
+
+client = TestClient(app)
+
+
+def test_negotiate_encoding():
+    assert negotiate_encoding("gzip") == "gzip"
+    assert negotiate_encoding("gzip;q=0, identity") is None
+    assert negotiate_encoding("") is None
+    assert negotiate_encoding("gzip, br, zstd") == "zstd"
+    assert negotiate_encoding("gzip, br") == "br"
+    assert negotiate_encoding("br;q=0.5, zstd;q=0.8") == "zstd"
+
+
+def test_large_response_is_gzipped():
+    res = client.get("/large", headers={"Accept-Encoding": "gzip"})
+    assert res.headers["content-encoding"] == "gzip"
+    assert "Accept-Encoding" in res.headers["vary"]
+    assert res.json() == LARGE
+
+
+def test_small_response_is_not_compressed():
+    res = client.get("/small", headers={"Accept-Encoding": "gzip"})
+    assert "content-encoding" not in res.headers
+
+
+def test_disabled_route_is_not_compressed():
+    res = client.get("/secret", headers={"Accept-Encoding": "gzip"})
+    assert "content-encoding" not in res.headers
+
+
+def test_cached_route_compresses_once():
+    STATS.reset()
+    first = client.get("/cached", headers={"Accept-Encoding": "gzip"})
+    second = client.get("/cached", headers={"Accept-Encoding": "gzip"})
+    assert first.json() == second.json() == LARGE
+    assert STATS.snapshot()["cache_hits"] == 1
+
+
+def test_exact_policy_does_not_cache_subpaths():
+    STATS.reset()
+    client.get("/cached/mine", headers={"Accept-Encoding": "gzip"})
+    client.get("/cached/mine", headers={"Accept-Encoding": "gzip"})
+    assert STATS.snapshot()["cache_hits"] == 0
+
+
+def test_cache_is_bounded_by_bytes():
+    cache = PrecompressedCache(max_entries=100, max_bytes=1000)
+    for i in range(10):
+        cache.put(("gzip", i), b"x" * 200)
+    assert cache.size <= 1000
+    assert len(cache) == 5
+    assert cache.get(("gzip", 9)) is not None and cache.get(("gzip", 0)) is None
+    # Bodies over a quarter of the budget are not cached at all
+    cache.put(("gzip", "large"), b"x" * 300)
+    assert cache.get(("gzip", "large")) is None
+
+
+def raw_body(path: str, accept_encoding: str):
+    # Read the body as sent, without the client decoding it
+    with client.stream("GET", path, headers={"Accept-Encoding": accept_encoding}) as res:
+        return res.headers.get("content-encoding"), b"".join(res.iter_raw())
+
+
+def test_brotli_and_zstd_round_trip():
+    encoding, body = raw_body("/large", "br")
+    assert encoding == "br"
+    assert json.loads(brotli.decompress(body)) == LARGE
+
+    encoding, body = raw_body("/large", "zstd")
+    assert encoding == "zstd"
+    assert json.loads(zstandard.ZstdDecompressor().decompress(body)) == LARGE
@@ -0,0 +1,23 @@
+import pytest
+from fastapi import HTTPException
+from app.loaders import DataLoader, parse_ids
+
+
+def test_deferred_keys_are_fetched_in_one_batch():
+    calls = []
+
+    def batch(keys):
+        calls.append(list(keys))
+        return {key: key * 10 for key in keys if key != 3}
+
+    loader = DataLoader(batch)
+    first, second, missing = loader.defer(1), loader.defer(2), loader.defer(3)
+    assert (first(), second(), missing()) == (10, 20, None)
+    assert loader.load_many([2, 1]) == [20, 10]
+    assert calls == [[1, 2, 3]]
+
+
+def test_parse_ids():
+    assert parse_ids("3,1,3, 2") == [3, 1, 2]
+    with pytest.raises(HTTPException):
+        parse_ids("1,abc")
@@ -0,0 +1,59 @@
+import pytest
+from app import database
+from app.models import INDEXES, PARTITIONED_TABLES, TABLES, create_indexes_concurrently
+from app.partitions import create_vote_partitions, ensure_post_partitions
+
+# Tables are created in a scratch schema without their indexes, as on an existing deployment
+SCHEMA = "test_models"
+
+
+@pytest.fixture
+def conn():
+    conn = database.get_connection()
+    yield conn
+    conn.rollback()
+    cursor = conn.cursor()
+    cursor.execute(f"DROP SCHEMA IF EXISTS {SCHEMA} CASCADE")
+    cursor.execute("RESET search_path")
+    conn.commit()
+    cursor.close()
+    database.release_connection(conn)
+
+
+def build_schema(conn, partitioned: bool):
+    cursor = conn.cursor()
+    cursor.execute(f"DROP SCHEMA IF EXISTS {SCHEMA} CASCADE")
+    cursor.execute(f"CREATE SCHEMA {SCHEMA}")
+    cursor.execute(f"SET search_path TO {SCHEMA}")
+    for statement in (PARTITIONED_TABLES if partitioned else TABLES).values():
+        cursor.execute(statement)
+    if partitioned:
+        create_vote_partitions(cursor, modulus=2)
+        ensure_post_partitions(cursor, months_ahead=1)
+    conn.commit()
+    cursor.close()
+
+
+def invalid_or_missing(conn) -> list:
+    cursor = conn.cursor()
+    missing = []
+    for name in INDEXES:
+        cursor.execute("SELECT indisvalid FROM pg_index WHERE indexrelid = to_regclass(%s)", (name,))
+        row = cursor.fetchone()
+        if row is None or not row["indisvalid"]:
+            missing.append(name)
+    cursor.close()
+    conn.commit()
+    return missing
+
+
+@pytest.mark.parametrize("partitioned", [False, True])
+def test_create_indexes_concurrently_builds_missing_indexes(conn, partitioned):
+    build_schema(conn, partitioned)
+    assert invalid_or_missing(conn) == list(INDEXES)
+
+    create_indexes_concurrently(conn)
+    assert invalid_or_missing(conn) == []
+    # Running it again is a no-op
+    create_indexes_concurrently(conn)
+    assert invalid_or_missing(conn) == []
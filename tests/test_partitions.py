@@ -0,0 +1,233 @@
+import gzip
+import json
+import os
+from datetime import date
+
+import pytest
+from app import database
+from app.models import INDEXES, PARTITIONED_TABLES
+from app.partitions import (
+    archive_post_partitions, create_vote_partitions, ensure_post_partitions, list_post_partitions
+)
+from app.loaders import POSTS_BY_ID_QUERY
+from app.routers.post import (
+    DELETE_POST_QUERY, DELETE_POST_VOTES_QUERY, POST_BY_ID_QUERY, POSTS_CURSOR_FILTER, POSTS_LISTING_QUERY,
+    UPDATE_POST_QUERY, owner_posts_query
+)
+from app.routers.vote import DELETE_VOTE_QUERY, FIND_VOTE_QUERY, INSERT_VOTE_QUERY, POST_EXISTS_QUERY
+
+# The partitioned schema is built in a scratch schema so the tests do not depend on settings
+SCHEMA = "test_partitions"
+TODAY = date(2024, 6, 15)
+SEEDED = {}
+
+
+@pytest.fixture(scope="module")
+def conn():
+    conn = database.get_connection()
+    cursor = conn.cursor()
+    cursor.execute(f"DROP SCHEMA IF EXISTS {SCHEMA} CASCADE")
+    cursor.execute(f"CREATE SCHEMA {SCHEMA}")
+    cursor.execute(f"SET search_path TO {SCHEMA}")
+    for statement in list(PARTITIONED_TABLES.values()):
+        cursor.execute(statement)
+    create_vote_partitions(cursor, modulus=8)
+    # January to July 2024
+    ensure_post_partitions(cursor, months_ahead=6, today=date(2024, 1, 1))
+    for statement in INDEXES.values():
+        cursor.execute(statement)
+    cursor.execute("INSERT INTO users (email, password) VALUES ('owner@example.com', 'x') RETURNING id")
+    owner_id = cursor.fetchone()["id"]
+    cursor.execute(
+        "INSERT INTO posts (title, content, owner_id, created_at) VALUES ('old', 'old', %s, '2024-01-10') RETURNING id",
+        (owner_id,)
+    )
+    old_post_id = cursor.fetchone()["id"]
+    cursor.execute("INSERT INTO votes (user_id, post_id) VALUES (%s, %s)", (owner_id, old_post_id))
+    conn.commit()
+    cursor.close()
+
+    SEEDED["old_post_id"] = old_post_id
+    yield conn
+
+    conn.rollback()
+    cursor = conn.cursor()
+    cursor.execute(f"DROP SCHEMA IF EXISTS {SCHEMA} CASCADE")
+    cursor.execute("RESET search_path")
+    conn.commit()
+    cursor.close()
+    database.release_connection(conn)
+
+
+def scanned_nodes(conn, query, params):
+    """Returns the plan nodes of a query that read or write a relation."""
+    cursor = conn.cursor()
+    cursor.execute("EXPLAIN (FORMAT JSON) " + query, params)
+    plan = cursor.fetchone()["QUERY PLAN"]
+    cursor.close()
+    plan = (json.loads(plan) if isinstance(plan, str) else plan)[0]["Plan"]
+
+    nodes = []
+    stack = [plan]
+    while stack:
+        node = stack.pop()
+        if "Relation Name" in node:
+            nodes.append(node)
+        stack.extend(node.get("Plans", []))
+    return nodes
+
+
+def scanned_relations(conn, query, params):
+    return {node["Relation Name"] for node in scanned_nodes(conn, query, params)}
+
+
+def test_post_queries_run_on_partitioned_posts(conn):
+    cursor = conn.cursor()
+    cursor.execute(POSTS_LISTING_QUERY.format(cursor_filter=""), {"search": "%old%", "limit": 10, "skip": 0})
+    listed = cursor.fetchall()
+    cursor.execute(POSTS_BY_ID_QUERY, ([SEEDED["old_post_id"]],))
+    by_id = cursor.fetchall()
+    cursor.close()
+    conn.rollback()
+
+    assert [row["id"] for row in listed] == [SEEDED["old_post_id"]]
+    assert by_id[0]["votes"] == 1
+    assert by_id[0]["owner_email"] == "owner@example.com"
+
+
+def test_vote_queries_prune_to_one_partition(conn):
+    for query in (FIND_VOTE_QUERY, DELETE_VOTE_QUERY):
+        relations = scanned_relations(conn, query, (1, 1))
+        assert len([name for name in relations if name.startswith("votes_p")]) == 1
+    conn.rollback()
+
+
+def test_vote_insert_routes_to_one_partition(conn):
+    cursor = conn.cursor()
+    cursor.execute("INSERT INTO users (email, password) VALUES ('voter@example.com', 'x') RETURNING id")
+    voter_id = cursor.fetchone()["id"]
+    cursor.execute(INSERT_VOTE_QUERY, (SEEDED["old_post_id"], voter_id))
+    cursor.execute(
+        "SELECT tableoid::regclass::text AS partition FROM votes WHERE post_id = %s AND user_id = %s",
+        (SEEDED["old_post_id"], voter_id)
+    )
+    partitions = [row["partition"] for row in cursor.fetchall()]
+    cursor.close()
+    # The row lands in the same single partition the lookup of that vote is pruned to
+    relations = scanned_relations(conn, FIND_VOTE_QUERY, (SEEDED["old_post_id"], voter_id))
+    assert len(partitions) == 1
+    assert {name for name in relations if name.startswith("votes_p")} == set(partitions)
+    conn.rollback()
+
+
+def test_vote_count_batch_prunes(conn):
+    relations = scanned_relations(
+        conn, "SELECT post_id, count(*) FROM votes WHERE post_id = ANY(%s) GROUP BY post_id", ([1, 2],)
+    )
+    assert 1 <= len([name for name in relations if name.startswith("votes_p")]) <= 2
+
+
+def test_owner_listing_page_prunes_newer_months(conn):
+    query = owner_posts_query(True)
+    params = {"owner_id": 1, "limit": 11, "after_created_at": "2024-03-01T00:00:00+00:00", "after_id": 1}
+    relations = scanned_relations(conn, query, params)
+    assert {"posts_y2024m01", "posts_y2024m02", "posts_y2024m03"} <= relations
+    assert not relations & {"posts_y2024m04", "posts_y2024m05", "posts_y2024m06", "posts_y2024m07"}
+
+
+def test_listing_page_prunes_newer_months(conn):
+    query = POSTS_LISTING_QUERY.format(cursor_filter=POSTS_CURSOR_FILTER)
+    params = {"search": "%", "limit": 11, "skip": 0, "after_created_at": "2024-03-01T00:00:00+00:00", "after_id": 1}
+    relations = scanned_relations(conn, query, params)
+    assert {"posts_y2024m01", "posts_y2024m02", "posts_y2024m03"} <= relations
+    assert not relations & {"posts_y2024m04", "posts_y2024m05", "posts_y2024m06", "posts_y2024m07"}
+
+
+def test_lookups_by_id_probe_every_month_by_primary_key(conn):
+    cursor = conn.cursor()
+    months = set(list_post_partitions(cursor))
+    cursor.close()
+    post_id = SEEDED["old_post_id"]
+    for query, params in (
+        (POST_EXISTS_QUERY, (post_id,)),
+        (POST_BY_ID_QUERY, (post_id,)),
+        (POSTS_BY_ID_QUERY, ([post_id],)),
+        (UPDATE_POST_QUERY, ("title", "content", post_id)),
+        (DELETE_POST_QUERY, (post_id,)),
+    ):
+        nodes = [node for node in scanned_nodes(conn, query, params) if node["Relation Name"] in months]
+        assert {node["Relation Name"] for node in nodes} == months
+        for node in nodes:
+            assert node["Node Type"] in ("Index Scan", "Index Only Scan")
+            assert node["Index Name"] == f"{node['Relation Name']}_pkey"
+    # Deleting a post's votes still prunes to the one votes partition of the post
+    relations = scanned_relations(conn, DELETE_POST_VOTES_QUERY, (post_id,))
+    assert len([name for name in relations if name.startswith("votes_p")]) == 1
+    conn.rollback()
+
+
+def test_posts_without_a_month_partition_move_out_of_default(conn):
+    cursor = conn.cursor()
+    cursor.execute(
+        "INSERT INTO posts (title, content, owner_id, created_at) VALUES ('late', 'late', 1, '2024-09-05') RETURNING id"
+    )
+    post_id = cursor.fetchone()["id"]
+    cursor.execute("SELECT tableoid::regclass::text AS partition FROM posts WHERE id = %s", (post_id,))
+    assert cursor.fetchone()["partition"] == "posts_default"
+
+    ensure_post_partitions(cursor, months_ahead=0, today=date(2024, 9, 1))
+    cursor.execute("SELECT tableoid::regclass::text AS partition FROM posts WHERE id = %s", (post_id,))
+    assert cursor.fetchone()["partition"] == "posts_y2024m09"
+    cursor.close()
+    conn.rollback()
+
+
+def test_archive_skips_partitions_it_cannot_lock(conn, tmp_path):
+    # A long running reader keeps posts locked
+    reader = database.get_connection()
+    reader_cursor = reader.cursor()
+    reader_cursor.execute(f"SET search_path TO {SCHEMA}")
+    reader_cursor.execute("SELECT count(*) FROM posts")
+    try:
+        archived = archive_post_partitions(
+            conn, retention_months=4, archive_dir=str(tmp_path), today=TODAY, lock_timeout="100ms", attempts=1
+        )
+    finally:
+        reader.rollback()
+        reader_cursor.close()
+        database.release_connection(reader)
+
+    assert archived == []
+    cursor = conn.cursor()
+    assert "posts_y2024m01" in list_post_partitions(cursor)
+    cursor.close()
+    conn.rollback()
+
+
+def test_archive_exports_and_drops_old_partitions(conn, tmp_path):
+    archived = archive_post_partitions(conn, retention_months=4, archive_dir=str(tmp_path), today=TODAY)
+    assert archived == ["posts_y2024m01"]
+
+    with gzip.open(os.path.join(tmp_path, "posts_y2024m01.posts.csv.gz"), "rt") as archive:
+        assert len(archive.read().splitlines()) == 2  # header + the old post
+    with gzip.open(os.path.join(tmp_path, "posts_y2024m01.votes.csv.gz"), "rt") as archive:
+        assert len(archive.read().splitlines()) == 2  # header + its vote
+
+    cursor = conn.cursor()
+    cursor.execute("SELECT count(*) AS votes FROM votes WHERE post_id = %s", (SEEDED["old_post_id"],))
+    assert cursor.fetchone()["votes"] == 0
+    cursor.execute("SELECT to_regclass('posts_y2024m01') AS partition")
+    assert cursor.fetchone()["partition"] is None
+    cursor.close()
+    conn.rollback()
+
+
+def test_archive_picks_up_partitions_left_detached(conn, tmp_path):
+    cursor = conn.cursor()
+    cursor.execute("ALTER TABLE posts DETACH PARTITION posts_y2024m02")
+    conn.commit()
+    cursor.close()
+
+    archived = archive_post_partitions(conn, retention_months=3, archive_dir=str(tmp_path), today=TODAY)
+    assert archived == ["posts_y2024m02"]
+    assert os.path.exists(os.path.join(tmp_path, "posts_y2024m02.posts.csv.gz"))
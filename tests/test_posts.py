@@ -0,0 +1,42 @@
+import uuid
+from datetime import datetime, timezone
+
+import pytest
+from fastapi import HTTPException
+from fastapi.testclient import TestClient
+from app.main import app
+from app.routers.post import decode_cursor, encode_cursor
+
+client = TestClient(app)
+
+
+def test_cursor_round_trip():
+    created_at = datetime(2024, 11, 3, 12, 30, 15, 123456, tzinfo=timezone.utc)
+    assert decode_cursor(encode_cursor(created_at, 42)) == (created_at, 42)
+
+
+def test_invalid_cursor_is_rejected():
+    with pytest.raises(HTTPException):
+        decode_cursor("not-a-cursor")
+
+
+def test_posts_cursor_paging():
+    email = f"paging-{uuid.uuid4().hex}@example.com"
+    client.post("/users", json = {"email": email, "password": "password124"})
+    res = client.post("/login", data = {"username": email, "password": "password124"})
+    headers = {"Authorization": f"Bearer {res.json()['access_token']}"}
+    # A unique title keeps posts left over from earlier runs out of the search
+    title = f"paging {uuid.uuid4().hex}"
+    created = [
+        client.post("/posts", json = {"title": f"{title} {i}", "content": "content"}, headers = headers).json()["id"]
+        for i in range(3)
+    ]
+
+    res = client.get("/posts", params = {"search": title, "limit": 2}, headers = headers)
+    first_page = [post["Post"]["id"] for post in res.json()]
+    cursor = res.headers["X-Next-Cursor"]
+    res = client.get("/posts", params = {"search": title, "limit": 2, "cursor": cursor}, headers = headers)
+    second_page = [post["Post"]["id"] for post in res.json()]
+
+    assert first_page + second_page == created[::-1]
+    assert "X-Next-Cursor" not in res.headers
@@ -0,0 +1,106 @@
+import marshal
+import threading
+import time
+
+from fastapi import APIRouter, Depends, FastAPI
+from fastapi.testclient import TestClient
+from app import oauth2, profiling
+from app.profiling import (
+    ProfiledRoute, ProfilingMiddleware, SamplingProfiler, create_profile_token, verify_profile_token
+)
+
+
+def test_profile_token():
+    assert verify_profile_token(create_profile_token(60))
+    expires, _, signature = create_profile_token(60).partition(".")
+    assert not verify_profile_token(f"{int(expires) + 1}.{signature}")
+    assert not verify_profile_token("not-a-token")
+    assert not verify_profile_token("\u00b9.abc")
+
+
+def profiled_dependency():
+    return sum(range(1000))
+
+
+router = APIRouter(route_class=ProfiledRoute)
+
+
+@router.get("/work")
+def profiled_endpoint(total: int = Depends(profiled_dependency)):
+    return {"total": total}
+
+
+@router.get("/me")
+def current_user_endpoint(current_user: dict = Depends(oauth2.get_current_user)):
+    return {"id": current_user["id"]}
+
+
+app = FastAPI()
+app.include_router(router)
+app.add_middleware(ProfilingMiddleware)
+client = TestClient(app)
+
+
+def test_dependency_overrides_apply_to_instrumented_dependencies():
+    app.dependency_overrides[oauth2.get_current_user] = lambda: {"id": 7}
+    try:
+        res = client.get("/me")
+    finally:
+        app.dependency_overrides.clear()
+    assert res.status_code == 200
+    assert res.json() == {"id": 7}
+    assert client.get("/me").status_code == 401
+
+
+def test_malformed_profile_header_is_ignored():
+    # Starlette decodes headers as latin-1, so the raw byte 0xB9 arrives as "¹"
+    res = client.get("/work", headers=[(b"x-profile", b"\xb9.abc")])
+    assert res.json() == {"total": 499500}
+
+
+def test_unprofiled_request_is_served_normally():
+    res = client.get("/work")
+    assert res.json() == {"total": 499500}
+    assert "x-profile-duration-ms" not in res.headers
+
+
+def test_profiled_request_returns_its_profile():
+    res = client.get("/work", headers={"X-Profile": create_profile_token(60)})
+    assert res.status_code == 200
+    assert res.headers["x-profile-original-status"] == "200"
+    assert res.headers["x-profile-scope"] == ("process" if profiling.PROCESS_WIDE_PROFILER else "thread")
+    assert res.headers["x-profile-overlapping-requests"] == "0"
+    assert "function calls" in res.text
+
+    res = client.get("/work", headers={"X-Profile": create_profile_token(60), "X-Profile-Format": "pstats"})
+    functions = {name for _, _, name in marshal.loads(res.content)}
+    assert {"profiled_endpoint", "profiled_dependency"} <= functions
+
+
+def busy_work(stop):
+    while not stop.is_set():
+        sum(range(1000))
+
+
+def test_sampler_aggregates_stacks_per_route_within_overhead_budget():
+    sampler = SamplingProfiler(interval=0.002, max_overhead=0.05)
+    stop = threading.Event()
+    worker = threading.Thread(target=busy_work, args=(stop,))
+    worker.start()
+    profiling._active_threads[worker.ident] = "/posts/"
+    sampler.start()
+    try:
+        time.sleep(0.3)
+    finally:
+        sampler.stop()
+        stop.set()
+        profiling._active_threads.pop(worker.ident, None)
+        worker.join()
+
+    stats = sampler.stats()
+    assert stats["routes"]["/posts/"] > 0
+    assert stats["overhead"] <= 0.05
+    assert "busy_work" in sampler.collapsed("/posts/")
+    speedscope = sampler.speedscope("/posts/")
+    assert speedscope["profiles"][0]["name"] == "/posts/"
+    assert any(frame["name"] == "busy_work" for frame in speedscope["shared"]["frames"])
@@ -0,0 +1,104 @@
+from datetime import datetime, timedelta, timezone
+
+import psycopg2
+import pytest
+from fastapi import HTTPException
+from app import sharding
+from app.config import settings
+from app.sharding import ShardMap, merge_pages
+
+
+def test_post_ids_route_with_their_owner():
+    shards = ShardMap(4, {"a": "dsn-a", "b": "dsn-b"}, ["a", "b", "a", "b"])
+    # Ids are generated as sequence * buckets + bucket(owner)
+    for owner_id in range(1, 20):
+        post_id = 1234 * shards.buckets + shards.bucket_for_owner(owner_id)
+        assert shards.node_for_post(post_id) == shards.node_for_owner(owner_id)
+
+
+def test_shard_map_rejects_unknown_nodes():
+    with pytest.raises(ValueError):
+        ShardMap(2, {"a": "dsn-a"}, ["a", "b"])
+
+
+def test_writes_to_a_moving_bucket_are_rejected(monkeypatch):
+    shards = ShardMap(4, {"a": "dsn-a", "b": "dsn-b"}, ["a", "b", "a", "b"], moving=[1])
+    monkeypatch.setattr(settings, "sharding_enabled", True)
+    monkeypatch.setattr(sharding, "shard_map", lambda: shards)
+    with pytest.raises(HTTPException) as error:
+        sharding.get_owner_connection(5)
+    assert error.value.status_code == 503
+    with pytest.raises(HTTPException):
+        sharding.get_post_connection(1234 * shards.buckets + 1)
+
+
+def test_merge_pages_keeps_newest_first():
+    now = datetime.now(timezone.utc)
+    rows = [{"id": i, "created_at": now - timedelta(minutes=i)} for i in range(9)]
+    pages = [rows[0::3], rows[1::3], rows[2::3]]
+    assert [row["id"] for row in merge_pages(pages, 5)] == [0, 1, 2, 3, 4]
+
+
+# The tests below need the shard nodes from Docker-Deployment/docker-compose-shards.yml
+requires_shards = pytest.mark.skipif(not settings.sharding_enabled, reason="sharding is not enabled")
+
+
+SCHEMA = "test_sharding"
+
+
+def scratch_dsn(dsn: str) -> str:
+    separator = "&" if "?" in dsn else "?"
+    return f"{dsn}{separator}options=-csearch_path%3D{SCHEMA}"
+
+
+@pytest.fixture
+def shards(tmp_path, monkeypatch):
+    # Work on a copy of the shard map pointing at a scratch schema on every node, since
+    # moving buckets rewrites the map and moves every row of the bucket
+    real = ShardMap.load(settings.shard_map_path)
+    for dsn in real.nodes.values():
+        conn = psycopg2.connect(dsn)
+        conn.cursor().execute(f"DROP SCHEMA IF EXISTS {SCHEMA} CASCADE; CREATE SCHEMA {SCHEMA}")
+        conn.commit()
+        conn.close()
+
+    path = tmp_path / "shard_map.json"
+    ShardMap(real.buckets, {node: scratch_dsn(dsn) for node, dsn in real.nodes.items()}, real.routing).save(str(path))
+    monkeypatch.setattr(settings, "shard_map_path", str(path))
+    monkeypatch.setattr(sharding, "_map", None)
+    monkeypatch.setattr(sharding, "_pools", {})
+    sharding.create_shard_tables()
+    yield sharding.shard_map()
+
+    for node_pool in sharding._pools.values():
+        node_pool.closeall()
+    for dsn in real.nodes.values():
+        conn = psycopg2.connect(dsn)
+        conn.cursor().execute(f"DROP SCHEMA IF EXISTS {SCHEMA} CASCADE")
+        conn.commit()
+        conn.close()
+
+
+@requires_shards
+def test_scatter_gather_listing_and_bucket_move(shards):
+    owners = range(1_000_001, 1_000_001 + 2 * shards.buckets)
+    created = []
+    for owner_id in owners:
+        conn = sharding.get_owner_connection(owner_id)
+        cursor = conn.cursor()
+        created.append(sharding.insert_post(cursor, owner_id, "sharding test", "content"))
+        conn.commit()
+        cursor.close()
+        sharding.release_connection(conn)
+
+    listed = sharding.list_posts("sharding test", len(created))
+    assert {row["id"] for row in listed} == {row["id"] for row in created}
+    keys = [(row["created_at"], row["id"]) for row in listed]
+    assert keys == sorted(keys, reverse=True)
+
+    bucket = shards.bucket_for_owner(owners[0])
+    target = next(node for node in shards.nodes if node != shards.routing[bucket])
+    result = sharding.move_bucket(bucket, target)
+    assert result["posts"] == 2
+    assert sharding.shard_map().routing[bucket] == target
+    assert {row["owner_id"] for row in sharding.list_owner_posts(owners[0], 10)} == {owners[0]}
@@ -20,4 +20,24 @@ def test_create_user():
 
 def test_login_user():
     res = client.post("/login", data = {"username" : "User5@gmail.com","password": "password124"})
-    assert res.status_code == 200
\ No newline at end of file
+    assert res.status_code == 200
+
+def test_refresh_token_rotation_and_reuse():
+    res = client.post("/login", data = {"username" : "User5@gmail.com","password": "password124"})
+    first = schemas.Token(**res.json())
+    assert first.refresh_token
+
+    res = client.post("/token/refresh", json = {"refresh_token": first.refresh_token})
+    assert res.status_code == 200
+    second = schemas.Token(**res.json())
+    assert second.refresh_token != first.refresh_token
+
+    # Reusing the rotated-out token is rejected and revokes the session
+    res = client.post("/token/refresh", json = {"refresh_token": first.refresh_token})
+    assert res.status_code == 401
+    res = client.post("/token/refresh", json = {"refresh_token": second.refresh_token})
+    assert res.status_code == 401
+
+    # Non-ASCII digits in the session id are rejected like any other malformed token
+    res = client.post("/token/refresh", json = {"refresh_token": "\u00b9.abc"})
+    assert res.status_code == 401